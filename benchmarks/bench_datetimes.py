@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+'''
+Microbenchmark of datetime formatting as done when dumping objects.
+Compares nv.datetimes with the previous arrow-based implementation
+(skipped if arrow is not installed). fmt_datetime is measured both with
+warm caches (every value already formatted, as for repeated datetimes)
+and cold ones (every value formatted for the first time).
+Run from the repository root: python3 -m benchmarks.bench_datetimes
+'''
+
+import datetime as dt
+import random
+import timeit
+import argparse
+from nv.datetimes import (
+    fmt_datetime,
+    get_datetime,
+    _fmt_naive_datetime,
+    _fmt_utc_datetime,
+)
+
+
+DEF_N_VALUES = 2048*4
+DEF_N_REPEATS = 5
+
+
+def get_values(n):
+    #naive UTC datetimes, as loaded from the database
+    start = dt.datetime(2018, 1, 1)
+    return [start + dt.timedelta(seconds=random.randint(0, 10**8))
+        for __ in range(n)]
+
+
+def arrow_fmt_datetime(datetime):
+    import arrow
+    return arrow.get(datetime).datetime.astimezone(
+        dt.timezone.utc).isoformat()
+
+
+def clear_caches():
+    _fmt_naive_datetime.cache_clear()
+    _fmt_utc_datetime.cache_clear()
+
+
+def bench(name, fn, values, n_repeats, setup=lambda: None):
+    #setup is run before each repeat
+    secs = min(timeit.repeat(lambda: [fn(v) for v in values],
+        setup=setup, number=1, repeat=n_repeats))
+    print('{}: {:.2f} us/value'.format(name, 10**6*secs/len(values)))
+    return secs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_values', type=int, default=DEF_N_VALUES)
+    parser.add_argument('--n_repeats', type=int, default=DEF_N_REPEATS)
+    args = parser.parse_args()
+
+    values = get_values(args.n_values)
+    warm_secs = bench(
+        'fmt_datetime (warm)', fmt_datetime, values, args.n_repeats)
+    cold_secs = bench('fmt_datetime (cold)', fmt_datetime, values,
+        args.n_repeats, setup=clear_caches)
+    bench('get_datetime', get_datetime, values, args.n_repeats)
+    try:
+        import arrow
+    except ImportError:
+        print('arrow not installed, skipping comparison')
+        return
+    old_secs = bench('arrow', arrow_fmt_datetime, values, args.n_repeats)
+    print('speedup (warm): {:.1f}x'.format(old_secs/warm_secs))
+    print('speedup (cold): {:.1f}x'.format(old_secs/cold_secs))
+
+
+if __name__ == '__main__':
+    main()
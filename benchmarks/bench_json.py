@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark of JSON encoders (see nv.representations) on topics and posts
+pages as returned by the API, with nested users, avatars, subforums and
+last posts. Data is generated in an in-memory database.
+Run from the repository root: python3 -m benchmarks.bench_json
+'''
+
+import json
+import timeit
+import argparse
+from nv.app import get_app
+from nv import metaconfig
+from nv.database import db
+from nv.models import (
+    User,
+    Avatar,
+    Subforum,
+    Topic,
+    Post,
+)
+from nv.representations import get_available_encoders, get_dumps
+
+
+DEF_N_TOPICS = 2048
+DEF_N_POSTS = 2048
+DEF_N_REPEATS = 5
+N_USERS = 64
+N_SUBFORUMS = 16
+
+
+def populate(n_topics, n_posts):
+    avatar = Avatar.create_and_save(
+        uri='http://example.com/img.jpg', category='dummy')
+    users = [User.create_and_save(
+        username='user_{}'.format(i),
+        password='x',
+        email='user_{}@users.com'.format(i),
+        signature='signature of user {}'.format(i),
+        avatar_id=avatar.avatar_id,
+    ) for i in range(N_USERS)]
+    subforums = [Subforum.create_and_save(
+        title='subforum {}'.format(i),
+        description='description of subforum {}'.format(i),
+        position=i,
+    ) for i in range(N_SUBFORUMS)]
+    topics = [Topic(
+        title='topic {} about something'.format(i),
+        subforum_id=subforums[i%len(subforums)].subforum_id,
+        user_id=users[i%len(users)].user_id,
+    ) for i in range(n_topics)]
+    db.session.add_all(topics)
+    db.session.flush()
+    db.session.add_all(Post(
+        content='content of post {} with some words in it'.format(i)*4,
+        topic_id=topics[i%len(topics)].topic_id,
+        user_id=users[i%len(users)].user_id,
+    ) for i in range(n_posts))
+    Topic.refresh_activity()
+    User.refresh_activity()
+    db.session.commit()
+
+
+def get_payloads(app, n_topics, n_posts):
+    with app.app_context():
+        db.create_all()
+        populate(n_topics, n_posts)
+    with app.test_client() as client:
+        return {
+            'topics': json.loads(client.get(
+                '/api/topics?max_n_results={}'.format(n_topics)).data),
+            'posts': json.loads(client.get(
+                '/api/posts?max_n_results={}'.format(n_posts)).data),
+        }
+
+
+def bench(name, fn, payload, n_repeats):
+    secs = min(timeit.repeat(lambda: fn(payload), number=1, repeat=n_repeats))
+    print('{}: {:.2f} ms'.format(name, 10**3*secs))
+    return secs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_topics', type=int, default=DEF_N_TOPICS)
+    parser.add_argument('--n_posts', type=int, default=DEF_N_POSTS)
+    parser.add_argument('--n_repeats', type=int, default=DEF_N_REPEATS)
+    args = parser.parse_args()
+
+    conf = metaconfig.get_app_test_config_class()
+    conf.RESPONSE_CACHE = 'none'
+    payloads = get_payloads(get_app(conf), args.n_topics, args.n_posts)
+    for payload_name, payload in payloads.items():
+        print('{} ({} objects):'.format(payload_name, len(payload['data'])))
+        secs = {}
+        for name in get_available_encoders():
+            secs[name] = bench('  {}'.format(name),
+                get_dumps(name, compact=True), payload, args.n_repeats)
+        for name in secs:
+            print('  {} speedup: {:.1f}x'.format(
+                name, secs['json']/secs[name]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark of the compiled serializers (see nv.serializers) against the
+schemas (see nv.schemas) on pages of topics and posts, from the query to
+the dumped objects. Data is generated in an in-memory database.
+Run from the repository root: python3 -m benchmarks.bench_serializers
+'''
+
+import timeit
+import argparse
+from nv.app import get_app
+from nv import metaconfig
+from nv.models import (
+    Topic,
+    Post,
+)
+from nv.schemas import (
+    TopicSchema,
+    PostSchema,
+)
+from nv.serializers import (
+    TOPIC_SERIALIZER,
+    POST_SERIALIZER,
+)
+from nv.resources.common import (
+    TOPICS_LOADING_PROFILE,
+    POSTS_LOADING_PROFILE,
+    get_dump_fields,
+)
+from nv.database import db
+from benchmarks.bench_json import populate
+
+
+DEF_N_TOPICS = 2048
+DEF_N_POSTS = 2048
+DEF_N_REPEATS = 5
+
+
+CASES = [
+    ('topics', Topic, TopicSchema, TOPICS_LOADING_PROFILE, TOPIC_SERIALIZER),
+    ('posts', Post, PostSchema, POSTS_LOADING_PROFILE, POST_SERIALIZER),
+]
+
+
+def schema_dump(model, schema_cls, loading_profile):
+    schema = schema_cls(many=True)
+    fields = get_dump_fields(schema)
+    objs = loading_profile.apply(model.query, fields).all()
+    schema.context.update(loading_profile.get_context(objs, fields))
+    return schema.dump(objs)
+
+
+def compiled_dump(model, serializer):
+    return serializer.dump_all(serializer.apply(model.query).all())
+
+
+def bench(name, fn, n_repeats):
+    def run():
+        fn()
+        #objects must be loaded again in every run
+        db.session.expunge_all()
+    secs = min(timeit.repeat(run, number=1, repeat=n_repeats))
+    print('{}: {:.2f} ms'.format(name, 10**3*secs))
+    return secs
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_topics', type=int, default=DEF_N_TOPICS)
+    parser.add_argument('--n_posts', type=int, default=DEF_N_POSTS)
+    parser.add_argument('--n_repeats', type=int, default=DEF_N_REPEATS)
+    args = parser.parse_args()
+
+    conf = metaconfig.get_app_test_config_class()
+    conf.RESPONSE_CACHE = 'none'
+    app = get_app(conf)
+    with app.app_context():
+        db.create_all()
+        populate(args.n_topics, args.n_posts)
+        for name, model, schema_cls, loading_profile, serializer in CASES:
+            print('{} ({} objects):'.format(name, model.query.count()))
+            schema_secs = bench('  schema',
+                lambda: schema_dump(model, schema_cls, loading_profile),
+                args.n_repeats)
+            compiled_secs = bench('  compiled',
+                lambda: compiled_dump(model, serializer), args.n_repeats)
+            print('  speedup: {:.1f}x'.format(schema_secs/compiled_secs))
+
+
+if __name__ == '__main__':
+    main()
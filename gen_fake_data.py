@@ -7,7 +7,7 @@ import datetime as dt
 import uuid
 import json
 import os
-import arrow
+from nv.datetimes import get_datetime
 
 
 DEF_N_AVATARS = 100
@@ -16,7 +16,7 @@ DEF_N_SUBFORUMS = 50
 DEF_N_TOPICS = 150
 DEF_N_POSTS = 500
 DEF_DST_PATH = os.path.join('data', 'fake-data.json')
-MIN_START_DATE = arrow.get(dt.datetime(1974, 1, 1)).datetime
+MIN_START_DATE = get_datetime(dt.datetime(1974, 1, 1))
 MAX_TIMEDELTA = dt.timedelta(days=365*13)
 
 
@@ -110,10 +110,6 @@ AVATAR_CATEGORIES = [
 ]
 
 
-def get_datetime(datetime):
-    return arrow.get(datetime).datetime
-
-
 def sample(lst, n):
     return random.sample(lst, min(len(lst), n))
 
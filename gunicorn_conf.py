@@ -0,0 +1,19 @@
+'''
+Gunicorn settings: workers ids from NEWVALLEY_WORKER_ID (see nv/ids.py).
+'''
+
+
+def on_starting(server):
+    from nv.ids import get_default_worker_id
+    #checks the whole range of worker ids of the host
+    get_default_worker_id(slot=server.cfg.workers - 1, required=True)
+
+
+def pre_fork(server, worker):
+    slots = {getattr(w, 'nv_slot', None) for w in server.WORKERS.values()}
+    worker.nv_slot = min(i for i in range(len(slots) + 1) if not i in slots)
+
+
+def post_fork(server, worker):
+    from nv.ids import set_worker_slot
+    set_worker_slot(worker.nv_slot, required=True)
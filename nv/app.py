@@ -5,6 +5,10 @@ from flask import Flask
 from nv.extensions import db, api, jwt, cors
 from nv import metaconfig
 from nv.errors import register_handlers
+from nv.cache import init_shared_cache
+from nv.response_cache import init_response_cache
+from nv.conditional import init_conditional
+from nv.compression import init_compression
 
 def get_app(conf_obj=None):
     if conf_obj is None:
@@ -24,6 +28,10 @@ def register_extensions(app):
     jwt.init_app(app)
     cors.init_app(app)
     api.init_app(app)
+    init_shared_cache(app)
+    init_response_cache(app)
+    init_conditional(app)
+    init_compression(app)
 
 def register_error_handlers(app):
     register_handlers(app)
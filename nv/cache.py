@@ -0,0 +1,127 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app
+from werkzeug.contrib import cache as wz_cache
+
+
+class TTLCache:
+    '''
+    Simple in-process (per worker) cache with per-entry time to live.
+    When full, least recently used entries are evicted first.
+    '''
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = None if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+
+class LRUCache(wz_cache.BaseCache):
+    '''
+    In-process (per worker) LRU cache with the werkzeug caches interface.
+    '''
+    def __init__(self, max_size=1024, default_timeout=300):
+        super().__init__(default_timeout)
+        self._cache = TTLCache(max_size)
+
+    def _get_ttl(self, timeout):
+        timeout = self.default_timeout if timeout is None else timeout
+        #0 stands for no expiration
+        return timeout or None
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, timeout=None):
+        self._cache.set(key, value, ttl=self._get_ttl(timeout))
+        return True
+
+    def add(self, key, value, timeout=None):
+        if key in self._cache:
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        self._cache.delete(key)
+        return True
+
+    def has(self, key):
+        return key in self._cache
+
+    def clear(self):
+        self._cache.clear()
+        return True
+
+
+def mk_cache(spec):
+    '''
+    Makes cache from spec, which may be either: 'simple' or 'lru[:<size>]'
+    (in-process, thus not shared by workers), 'filesystem:<dir>',
+    'redis://<host>:<port>[/<db>]' or 'memcached://<host>:<port>[,...]'.
+    '''
+    if spec == 'simple':
+        return wz_cache.SimpleCache()
+    elif spec == 'lru' or spec.startswith('lru:'):
+        __, __, max_size = spec.partition(':')
+        return LRUCache(max_size=int(max_size or 1024))
+    elif spec.startswith('filesystem:'):
+        return wz_cache.FileSystemCache(spec[len('filesystem:'):])
+    elif spec.startswith('redis://'):
+        host, __, db = spec[len('redis://'):].partition('/')
+        host, __, port = host.partition(':')
+        return wz_cache.RedisCache(
+            host=host, port=int(port or 6379), db=int(db or 0))
+    elif spec.startswith('memcached://'):
+        return wz_cache.MemcachedCache(spec[len('memcached://'):].split(','))
+    raise ValueError('invalid cache spec \'{}\''.format(spec))
+
+
+def is_distributed_cache_spec(spec):
+    '''
+    Tells if caches made from spec are seen by all workers, whatever
+    their host.
+    '''
+    return spec.startswith('redis://') or spec.startswith('memcached://')
+
+
+def init_shared_cache(app):
+    app.extensions['shared_cache'] = mk_cache(app.config['SHARED_CACHE'])
+
+
+def get_shared_cache():
+    return current_app.extensions['shared_cache']
+
+
+def is_shared_cache_distributed():
+    return is_distributed_cache_spec(current_app.config['SHARED_CACHE'])
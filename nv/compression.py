@@ -0,0 +1,96 @@
+'''
+Content-negotiated compression (gzip and, if installed, brotli) of responses.
+
+Bodies smaller than COMPRESSION_MIN_SIZE are sent as they are.
+Streamed responses are compressed chunk by chunk, each chunk being
+flushed so that clients can decode it as soon as it is received.
+'''
+
+import zlib
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+#gzip container for zlib
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def get_available_encodings():
+    '''
+    Gets supported encodings, by order of preference.
+    '''
+    return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+
+def get_accepted_encoding():
+    '''
+    Gets best encoding accepted by client (None for no compression).
+    '''
+    if not current_app.config['COMPRESSION']:
+        return None
+    return request.accept_encodings.best_match(get_available_encodings())
+
+
+def _mk_compressor(encoding):
+    if encoding == 'br':
+        compressor = brotli.Compressor(
+            quality=current_app.config['COMPRESSION_BROTLI_QUALITY'])
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(
+        current_app.config['COMPRESSION_LEVEL'], zlib.DEFLATED, _GZIP_WBITS)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def compress(data, encoding):
+    process, __, finish = _mk_compressor(encoding)
+    return process(data) + finish()
+
+
+def compress_chunks(chunks, encoding):
+    process, flush, finish = _mk_compressor(encoding)
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def is_compressible(data):
+    return len(data) >= current_app.config['COMPRESSION_MIN_SIZE']
+
+
+def compress_response(response):
+    if not current_app.config['COMPRESSION'] \
+            or response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = get_accepted_encoding()
+    if encoding is None or response.status_code != 200 \
+            or 'Content-Encoding' in response.headers:
+        return response
+    if response.is_streamed:
+        response.response = compress_chunks(response.response, encoding)
+    else:
+        data = response.get_data()
+        if not is_compressible(data):
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+def init_compression(app):
+    #after_request functions are called in reverse order of registration:
+    #this should be called last, so that responses are compressed before
+    #other hooks (e.g. validators headers) see them
+    app.after_request(compress_response)
@@ -0,0 +1,110 @@
+'''
+Validators (ETag/Last-Modified) of responses and conditional GETs.
+
+Validators are computed from the rows selected for a response (or from
+the loaded state of ORM objects), before they are serialized, so that a
+matching If-None-Match gets a 304 without any serialization.
+'''
+
+import hashlib
+import datetime as dt
+from flask import g, request, current_app
+from sqlalchemy import inspect
+from nv.datetimes import get_datetime
+from nv.compression import get_accepted_encoding
+
+
+def get_etag(*parts):
+    '''
+    Gets strong ETag (unquoted) from values that determine a response body.
+    '''
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def get_state_values(value):
+    '''
+    Gets hashable values of ORM objects in value (possibly nested in
+    dicts/lists/tuples): their loaded columns and loaded many-to-one
+    relationships. Nothing is loaded from the database.
+    '''
+    if isinstance(value, dict):
+        return tuple((k, get_state_values(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(get_state_values(v) for v in value)
+    if not hasattr(value, '_sa_instance_state'):
+        return value
+    state = inspect(value)
+    values = [state.mapper.class_.__name__]
+    for attr in state.mapper.column_attrs:
+        if attr.key in state.dict:
+            values.append(state.dict[attr.key])
+    for rel in state.mapper.relationships:
+        if not rel.uselist and rel.key in state.dict:
+            values.append(get_state_values(state.dict[rel.key]))
+    return tuple(values)
+
+
+def get_encoded_etag(etag, encoding):
+    '''
+    Gets ETag of a compressed representation, as it must differ from the
+    ETag of the identity one.
+    '''
+    return '{}-{}'.format(etag, encoding)
+
+
+def get_last_modified(rows):
+    '''
+    Gets latest of datetimes in rows (None if there are none).
+    '''
+    datetimes = [v for row in rows for v in row if isinstance(v, dt.datetime)]
+    return max(datetimes) if datetimes else None
+
+
+def set_validators(etag, last_modified=None):
+    g.validators = (etag, last_modified)
+
+
+def get_validators():
+    return g.get('validators')
+
+
+def get_not_modified_response():
+    '''
+    Gets 304 response if validators set for the current request match
+    the request preconditions, None otherwise.
+    '''
+    validators = get_validators()
+    if validators is None or request.method != 'GET':
+        return None
+    etag, __ = validators
+    #If-Modified-Since is not used: HTTP dates have one second granularity,
+    #so changes within the second of Last-Modified would be missed, and
+    #some values (e.g. counts) have no datetime of their own
+    encoding = get_accepted_encoding()
+    etags = [etag] if encoding is None \
+        else [get_encoded_etag(etag, encoding), etag]
+    #weak comparison, as proxies may weaken ETags of bodies they transform
+    etag = next(
+        (e for e in etags if request.if_none_match.contains_weak(e)), None)
+    if etag is None:
+        return None
+    resp = current_app.response_class(status=304)
+    resp.set_etag(etag)
+    return resp
+
+
+def add_validators_headers(response):
+    validators = get_validators()
+    if validators is not None and response.status_code == 200:
+        etag, last_modified = validators
+        encoding = response.headers.get('Content-Encoding')
+        if encoding is not None:
+            etag = get_encoded_etag(etag, encoding)
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = get_datetime(last_modified)
+    return response
+
+
+def init_conditional(app):
+    app.after_request(add_validators_headers)
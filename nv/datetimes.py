@@ -0,0 +1,85 @@
+'''
+Datetime handling, using the standard library and dateutil for parsing.
+
+Datetimes are stored naive (in UTC) by the database and are always
+returned aware (in UTC) by the functions below.
+'''
+
+import datetime as dt
+from functools import lru_cache
+from dateutil.parser import isoparse
+
+
+#maximum number of formatted datetimes kept in cache
+FMT_CACHE_SIZE = 8192
+
+_UTC = dt.timezone.utc
+
+
+def get_local_tz():
+    return dt.datetime.now(_UTC).astimezone().tzinfo
+
+
+def get_utc_tz():
+    return _UTC
+
+
+def parse_datetime(string):
+    '''
+    Parses ISO 8601 datetime string, in extended or basic format
+    (e.g. 2018-11-20T10:30:01.5Z, 20181120T103001Z or 2018-W47-2).
+    '''
+    string = string.strip()
+    if string.endswith('z'):
+        string = string[:-1] + 'Z'
+    try:
+        return isoparse(string)
+    except ValueError:
+        raise ValueError('invalid ISO datetime: {!r}'.format(string))
+
+
+def get_datetime(datetime):
+    '''
+    datetime may be either datetime object, date object, POSIX timestamp
+    or ISO-formatted datetime string.
+    if it doesn't contain tzinfo, assumes it's UTC.
+    '''
+    #fast path: naive datetimes as loaded from the database
+    if type(datetime) is dt.datetime and datetime.tzinfo is None:
+        return datetime.replace(tzinfo=_UTC)
+    if isinstance(datetime, str):
+        datetime = parse_datetime(datetime)
+    elif isinstance(datetime, (int, float)):
+        datetime = dt.datetime.fromtimestamp(datetime, _UTC)
+    elif not isinstance(datetime, dt.datetime):
+        if not isinstance(datetime, dt.date):
+            raise TypeError('cannot get datetime from {!r}'.format(datetime))
+        datetime = dt.datetime(datetime.year, datetime.month, datetime.day)
+    if datetime.tzinfo is None:
+        return datetime.replace(tzinfo=_UTC)
+    if datetime.tzinfo is _UTC:
+        return datetime
+    return datetime.astimezone(_UTC)
+
+
+@lru_cache(maxsize=FMT_CACHE_SIZE)
+def _fmt_naive_datetime(datetime):
+    return datetime.isoformat() + '+00:00'
+
+
+@lru_cache(maxsize=FMT_CACHE_SIZE)
+def _fmt_utc_datetime(datetime):
+    return datetime.isoformat()
+
+
+def fmt_datetime(datetime):
+    '''
+    Formats datetime (assumed to be in UTC if it has no tzinfo) in ISO.
+    '''
+    if type(datetime) is dt.datetime and datetime.tzinfo is None:
+        return _fmt_naive_datetime(datetime)
+    return _fmt_utc_datetime(get_datetime(datetime))
+
+
+def get_now():
+    return dt.datetime.now(_UTC)
@@ -0,0 +1,84 @@
+'''
+Set-based deletes of subforums, topics, posts and users along with their
+children, as a few statements whatever the number of children (ORM
+cascades would load and delete children one at a time, so models declare
+none and every delete of users, subforums and topics goes through here).
+Denormalized activity (users and topics counters and last posts) of rows
+that are kept is updated in the same transaction.
+'''
+
+from sqlalchemy import select, func, case, and_
+from nv.database import db
+from nv.models import (
+    User,
+    Subforum,
+    Topic,
+    Post,
+)
+
+
+#maximum number of ids per IN clause
+_MAX_N_IDS = 512
+
+
+def _partition(lst, size=_MAX_N_IDS):
+    return [lst[i:i + size] for i in range(0, len(lst), size)]
+
+
+def _decrement_users_counter(counter, model_cls, condition):
+    '''
+    Decrements counter of users by their number of model_cls objects
+    matching condition, with a single UPDATE.
+    '''
+    n_objs = select([func.count()]).where(
+        and_(model_cls.user_id == User.user_id, condition)).as_scalar()
+    authors_ids = select([model_cls.user_id]).where(condition)
+    User.query.filter(User.user_id.in_(authors_ids)).update({
+        counter: case([(counter > n_objs, counter - n_objs)], else_=0),
+    }, synchronize_session=False)
+
+
+def delete_posts(condition, refresh_topics=True):
+    '''
+    Deletes posts matching condition (e.g. Post.user_id == 1).
+    Topics activity is refreshed unless refresh_topics is False (e.g. if
+    topics are deleted as well).
+    '''
+    topics_ids = []
+    if refresh_topics:
+        query = db.session.query(Post.topic_id).filter(condition).distinct()
+        topics_ids = [t for t, in query]
+    _decrement_users_counter(User.n_posts, Post, condition)
+    n_posts = Post.query.filter(condition).delete(synchronize_session=False)
+    for ids in _partition(topics_ids):
+        Topic.refresh_activity(ids)
+    return n_posts
+
+
+def delete_topics(condition):
+    '''
+    Deletes topics matching condition (e.g. Topic.subforum_id == 1) and
+    their posts.
+    '''
+    topics_ids = select([Topic.topic_id]).where(condition)
+    delete_posts(Post.topic_id.in_(topics_ids), refresh_topics=False)
+    _decrement_users_counter(User.n_topics, Topic, condition)
+    return Topic.query.filter(condition).delete(synchronize_session=False)
+
+
+def delete_topic(topic):
+    delete_topics(Topic.topic_id == topic.topic_id)
+
+
+def delete_subforum(subforum):
+    delete_topics(Topic.subforum_id == subforum.subforum_id)
+    Subforum.query.filter_by(subforum_id=subforum.subforum_id).delete(
+        synchronize_session=False)
+
+
+def delete_user(user):
+    delete_topics(Topic.user_id == user.user_id)
+    #posts in topics of other users
+    delete_posts(Post.user_id == user.user_id)
+    User.query.filter_by(user_id=user.user_id).delete(
+        synchronize_session=False)
@@ -17,8 +17,11 @@ from nv.resources import (
     topics,
     posts,
     avatars,
+    moderation,
 )
+from nv.representations import output_json
 api = Api(prefix='/api')
+api.representation('application/json')(output_json)
 #avatars
 api.add_resource(avatars.AvatarsRes, '/avatars')
 api.add_resource(avatars.AvatarRes, '/avatars/<int:avatar_id>')
@@ -38,9 +41,14 @@ api.add_resource(
 api.add_resource(topics.TopicsRes, '/topics')
 api.add_resource(topics.TopicRes, '/topics/<int:topic_id>')
 api.add_resource(topics.TopicPostsRes, '/topics/<int:topic_id>/posts')
+api.add_resource(topics.TopicPageRes, '/topics/<int:topic_id>/page')
 #posts
 api.add_resource(posts.PostsRes, '/posts')
 api.add_resource(posts.PostRes, '/posts/<int:post_id>')
+#moderation (bulk editions)
+api.add_resource(moderation.UserPostsModerationRes,
+    '/moderation/users/<int:user_id>/posts')
+api.add_resource(moderation.TopicsModerationRes, '/moderation/topics')
 #auth
 api.add_resource(auth.Login, '/auth/login')
 api.add_resource(auth.TokenRefresh, '/auth/token_refresh')
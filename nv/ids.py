@@ -0,0 +1,114 @@
+'''
+Time-ordered 64-bit IDs (snowflake-like), used as primary keys.
+
+From most to least significant bits, an ID is made of:
+- 41 bits: milliseconds since EPOCH (good for ~69 years);
+- 10 bits: worker id;
+- 12 bits: sequence number within the millisecond.
+IDs generated by a worker are strictly increasing, and IDs of different
+workers sort by time up to their clocks skew. The sign bit is never set,
+so that IDs fit signed BIGINT columns.
+
+Worker ids must be unique among all running workers, whatever their host:
+NEWVALLEY_WORKER_ID is the first worker id of a host, whose gunicorn
+workers take consecutive ids from it by slot (the lowest free index in
+host, reused by replacements of dead workers). A host running N workers
+thus uses ids [NEWVALLEY_WORKER_ID, NEWVALLEY_WORKER_ID + N), and ranges
+of hosts/containers must not overlap. Gunicorn (production) refuses to
+start without NEWVALLEY_WORKER_ID. It is read from the environment only,
+as the ids generator exists before any app config. Without it
+(development only), worker ids come from process ids, which may collide
+across hosts.
+'''
+
+import os
+import time
+import threading
+import datetime as dt
+
+
+EPOCH = dt.datetime(2018, 1, 1, tzinfo=dt.timezone.utc)
+_EPOCH_MS = int(EPOCH.timestamp()*1000)
+
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = 2**WORKER_ID_BITS - 1
+_SEQUENCE_MASK = 2**SEQUENCE_BITS - 1
+
+
+def get_default_worker_id(slot=0, required=False):
+    '''
+    Gets worker id from NEWVALLEY_WORKER_ID plus slot (index of worker in
+    host) or, if not set and not required, from the process id plus slot.
+    '''
+    worker_id = os.environ.get('NEWVALLEY_WORKER_ID')
+    if worker_id is None:
+        if required:
+            raise ValueError('NEWVALLEY_WORKER_ID must be set')
+        return (os.getpid() + slot)%(MAX_WORKER_ID + 1)
+    worker_id = int(worker_id) + slot
+    if not 0 <= worker_id <= MAX_WORKER_ID:
+        raise ValueError('worker id must be in [0, {}]'.format(MAX_WORKER_ID))
+    return worker_id
+
+
+def mk_id(ms, worker_id, sequence):
+    return (ms << (WORKER_ID_BITS + SEQUENCE_BITS)) \
+        | (worker_id << SEQUENCE_BITS) | sequence
+
+
+def get_id_ms(id_):
+    return id_ >> (WORKER_ID_BITS + SEQUENCE_BITS)
+
+
+def get_id_datetime(id_):
+    '''
+    Gets naive UTC datetime of creation of ID.
+    '''
+    return dt.datetime.utcfromtimestamp((get_id_ms(id_) + _EPOCH_MS)/1000)
+
+
+class IdGenerator:
+    def __init__(self, worker_id=None, clock=time.time):
+        self.clock = clock
+        self.reset(worker_id)
+
+    def reset(self, worker_id=None):
+        '''
+        Resets state, e.g. in processes forked from the one that created it.
+        '''
+        self.worker_id = get_default_worker_id() if worker_id is None \
+            else worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self):
+        with self._lock:
+            ms = int(self.clock()*1000) - _EPOCH_MS
+            #if the clock goes backwards or the sequence of the current
+            #millisecond is exhausted, the last millisecond is carried on
+            #instead of waiting, so that IDs keep increasing
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                self._sequence = (self._sequence + 1) & _SEQUENCE_MASK
+                if self._sequence == 0:
+                    ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = ms
+            return mk_id(ms, self.worker_id, self._sequence)
+
+
+_generator = IdGenerator()
+if hasattr(os, 'register_at_fork'):
+    #forked workers (e.g. by gunicorn --preload) must not share ids
+    os.register_at_fork(after_in_child=_generator.reset)
+
+
+def set_worker_slot(slot, required=False):
+    _generator.reset(get_default_worker_id(slot, required))
+
+
+def get_new_id():
+    return _generator.next_id()
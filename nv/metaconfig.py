@@ -38,6 +38,44 @@ class BaseAppConfig:
     #minimum posting time interval in seconds for posts and topics creation
     MIN_POST_TIME_INTERVAL = int(
         os.environ.get('NEWVALLEY_MIN_POST_TIME_INTERVAL', 30))
+    #time in seconds for collections totals to be cached with total_mode=cached
+    TOTALS_CACHE_TTL = int(
+        os.environ.get('NEWVALLEY_TOTALS_CACHE_TTL', 30))
+    #maximum time in seconds for a worker to see tokens revoked by others
+    REVOKED_TOKENS_CACHE_TTL = int(
+        os.environ.get('NEWVALLEY_REVOKED_TOKENS_CACHE_TTL', 10))
+    #maximum time in seconds for a worker to see changes of users roles/status
+    USERS_CACHE_TTL = int(
+        os.environ.get('NEWVALLEY_USERS_CACHE_TTL', 10))
+    #cache shared by workers: 'simple' (per worker), 'filesystem:<dir>',
+    #'redis://<host>:<port>[/<db>]' or 'memcached://<host>:<port>'
+    SHARED_CACHE = os.environ.get('NEWVALLEY_SHARED_CACHE', 'simple')
+    #cache of anonymous GET responses: 'none' or a cache spec as above.
+    #with more than one worker, it should be shared so that invalidations
+    #are seen by all workers
+    RESPONSE_CACHE = os.environ.get('NEWVALLEY_RESPONSE_CACHE', 'none')
+    #maximum time in seconds for responses to be kept in cache
+    RESPONSE_CACHE_TTL = int(
+        os.environ.get('NEWVALLEY_RESPONSE_CACHE_TTL', 60))
+    #time in seconds for users last posting times to be kept in shared cache
+    #(only used if it is distributed, i.e. redis or memcached)
+    LAST_POSTED_AT_CACHE_TTL = int(
+        os.environ.get('NEWVALLEY_LAST_POSTED_AT_CACHE_TTL', 5*60))
+    #JSON encoder of responses: 'auto' (fastest installed), 'orjson',
+    #'ujson' or 'json'
+    JSON_ENCODER = os.environ.get('NEWVALLEY_JSON_ENCODER', 'auto')
+    #content-negotiated compression of responses (brotli is used if installed)
+    COMPRESSION = os.environ.get(
+        'NEWVALLEY_COMPRESSION', 'true').lower() == 'true'
+    #minimum size in bytes of response bodies to be compressed
+    COMPRESSION_MIN_SIZE = int(
+        os.environ.get('NEWVALLEY_COMPRESSION_MIN_SIZE', 1024))
+    #gzip level (1-9) and brotli quality (0-11). low values are faster,
+    #which matters more than ratio for large and streamed responses
+    COMPRESSION_LEVEL = int(
+        os.environ.get('NEWVALLEY_COMPRESSION_LEVEL', 5))
+    COMPRESSION_BROTLI_QUALITY = int(
+        os.environ.get('NEWVALLEY_COMPRESSION_BROTLI_QUALITY', 4))
 
 
 def get_app_config_class(**override_environ):
@@ -66,4 +104,5 @@ def get_app_test_config_class(**override_environ):
         JWT_SECRET_KEY = 'jwtsecret'
         SQLALCHEMY_DATABASE_URI = 'sqlite://'
         MIN_POST_TIME_INTERVAL = 0
+        RESPONSE_CACHE = 'lru'
     return AppTestConfig
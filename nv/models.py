@@ -1,7 +1,12 @@
 from nv.database import db
 from sqlalchemy.orm import validates
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.ext.compiler import compiles
 from marshmallow import ValidationError
-import random
+from nv.ids import get_new_id
+from collections import OrderedDict
+from functools import lru_cache
+import datetime as dt
 
 Column = db.Column
 BigInteger = db.BigInteger
@@ -11,10 +16,35 @@ Text = db.Text
 DateTime = db.DateTime
 Table = db.Table
 ForeignKey = db.ForeignKey
+Index = db.Index
 func = db.func
+select = db.select
+case = db.case
 relationship = db.relationship
 Table = db.Table
 
+class now(FunctionElement):
+    '''
+    Current timestamp, as func.now() but with fractions of seconds in sqlite
+    (whose CURRENT_TIMESTAMP has none).
+    '''
+    type = db.DateTime()
+    name = 'now'
+
+
+@compiles(now)
+def _compile_now(element, compiler, **kwargs):
+    return compiler.process(func.now(), **kwargs)
+
+
+@compiles(now, 'sqlite')
+def _compile_sqlite_now(element, compiler, **kwargs):
+    #sqlite stores datetimes as text, compared as such in queries: the
+    #format is the one of python-side datetimes (as stored by sqlalchemy),
+    #with milliseconds only
+    return "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')"
+
+
 class Base(db.Model):
     __abstract__ = True
 
@@ -29,26 +59,25 @@ class Base(db.Model):
         return obj
 
 
-def get_rand_id():
-    return random.randint(0, 10**18)
-
-
 class Avatar(Base):
     __tablename__ = 'avatars'
-    avatar_id = Column(BigInteger, primary_key=True, default=get_rand_id)
+    avatar_id = Column(BigInteger, primary_key=True, default=get_new_id)
     uri = Column(String(256), nullable=False)
     category = Column(String(128), nullable=False)
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
+    created_at = Column(DateTime(timezone=False), server_default=now())
+    updated_at = Column(DateTime(timezone=False), onupdate=now())
     users = relationship('User', backref='avatar', lazy=True)
 
 
 class User(Base):
-    VALID_ROLES = {
-        'user',
-        'moderator',
-        'admin',
-    }
+    #bit of each role in roles_mask, in the order roles are listed
+    ROLES_BITS = OrderedDict([
+        ('user', 1),
+        ('moderator', 2),
+        ('admin', 4),
+    ])
+
+    VALID_ROLES = set(ROLES_BITS)
 
     VALID_STATUSES = {
         'active',
@@ -60,33 +89,132 @@ class User(Base):
 
     __tablename__ = 'users'
 
-    user_id = Column(BigInteger, primary_key=True, default=get_rand_id)
+    user_id = Column(BigInteger, primary_key=True, default=get_new_id)
     username = Column(String(128), unique=True, nullable=False)
     email = Column(String(128), unique=True, nullable=False)
     password = Column(String(128), nullable=False)
-    roles = Column(String(256), nullable=False, default='user')
+    roles_mask = Column(Integer, nullable=False, default=1, server_default='1')
     status = Column(String(64), nullable=False, default='active')
     avatar_id = Column(
         BigInteger, ForeignKey('avatars.avatar_id'), nullable=True)
     signature = Column(String(1024), nullable=False, default='')
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
-    posts = relationship('Post', backref='user', lazy=True, cascade='delete')
+    created_at = Column(DateTime(timezone=False), server_default=now())
+    updated_at = Column(DateTime(timezone=False), onupdate=now())
+    #children are deleted by nv.deletes with set-based statements, which
+    #also update denormalized activity: the ORM must neither cascade deletes
+    #(loading children one at a time) nor load children on deletes
+    posts = relationship(
+        'Post', backref='user', lazy=True, passive_deletes=True)
     n_posts = Column(Integer, nullable=False, default=0)
-    topics = relationship('Topic', backref='user', lazy=True, cascade='delete')
+    topics = relationship(
+        'Topic', backref='user', lazy=True, passive_deletes=True)
     n_topics = Column(Integer, nullable=False, default=0)
+    #denormalized activity, maintained on posts/topics creation
+    last_posted_at = Column(DateTime(timezone=False), nullable=True)
+    last_topic_created_at = Column(DateTime(timezone=False), nullable=True)
+
+    __table_args__ = (
+        Index('ix_users_created_at', 'created_at', 'user_id'),
+        Index('ix_users_roles_mask', 'roles_mask'),
+        Index('ix_users_status', 'status'),
+    )
+
+    @staticmethod
+    def get_roles_mask(roles):
+        '''
+        roles may be either an iterable of roles or a comma-separated string.
+        '''
+        if isinstance(roles, str):
+            roles = [r.strip() for r in roles.split(',') if r.strip()]
+        mask = 0
+        for role in roles:
+            mask |= User.ROLES_BITS[role]
+        return mask
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_roles_from_mask(mask):
+        return tuple(r for r, b in User.ROLES_BITS.items() if mask & b)
+
+    @staticmethod
+    def get_masks_with_any_role(roles):
+        '''
+        Gets all possible masks having at least one of roles, so that
+        filtering by roles can be done with an IN over the indexed column.
+        '''
+        mask = User.get_roles_mask(roles)
+        n_masks = 2**len(User.ROLES_BITS)
+        return [m for m in range(n_masks) if m & mask]
+
+    @property
+    def roles(self):
+        return list(User.get_roles_from_mask(self.roles_mask or 0))
+
+    @roles.setter
+    def roles(self, roles):
+        self.roles_mask = User.get_roles_mask(roles)
+
+    def has_role(self, role):
+        return bool(self.roles_mask & User.ROLES_BITS[role])
+
+    #counters are updated in SQL so that concurrent writes do not race
+
+    @classmethod
+    def add_post_activity(cls, post):
+        cls.query.filter_by(user_id=post.user_id).update({
+            cls.n_posts: cls.n_posts + 1,
+            cls.last_posted_at: post.created_at,
+        }, synchronize_session=False)
+
+    @classmethod
+    def remove_post_activity(cls, post):
+        cls.query.filter_by(user_id=post.user_id).update({
+            cls.n_posts: case([(cls.n_posts > 0, cls.n_posts - 1)], else_=0),
+        }, synchronize_session=False)
+
+    @classmethod
+    def add_topic_activity(cls, topic):
+        cls.query.filter_by(user_id=topic.user_id).update({
+            cls.n_topics: cls.n_topics + 1,
+            cls.last_topic_created_at: topic.created_at,
+        }, synchronize_session=False)
+
+    @classmethod
+    def refresh_activity(cls, user_ids=None):
+        '''
+        Recomputes activity of users (all of them if user_ids is None)
+        from the posts and topics tables.
+        '''
+        posts = Post.__table__
+        topics = Topic.__table__
+        user_id = cls.__table__.c.user_id
+        last_posted_at = select([func.max(posts.c.created_at)]).where(
+            posts.c.user_id == user_id)
+        last_topic_created_at = select([func.max(topics.c.created_at)]).where(
+            topics.c.user_id == user_id)
+        query = cls.query
+        if user_ids is not None:
+            user_ids = list(user_ids)
+            if not user_ids:
+                return
+            query = query.filter(cls.user_id.in_(user_ids))
+        query.update({
+            cls.last_posted_at: last_posted_at.as_scalar(),
+            cls.last_topic_created_at: last_topic_created_at.as_scalar(),
+        }, synchronize_session=False)
 
 
 class Subforum(Base):
     __tablename__ = 'subforums'
-    subforum_id = Column(BigInteger, primary_key=True, default=get_rand_id)
+    subforum_id = Column(BigInteger, primary_key=True, default=get_new_id)
     title = Column(String(64), unique=True, nullable=False)
     description = Column(String(128), nullable=False)
     position = Column(Integer, unique=True, nullable=False)
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
+    created_at = Column(DateTime(timezone=False), server_default=now())
+    updated_at = Column(DateTime(timezone=False), onupdate=now())
+    #children are deleted by nv.deletes only (see User.posts)
     topics = relationship(
-        'Topic', backref='subforum', lazy=True, cascade='delete')
+        'Topic', backref='subforum', lazy=True, passive_deletes=True)
 
 
 class Topic(Base):
@@ -100,16 +228,35 @@ class Topic(Base):
 
     __tablename__ = 'topics'
 
-    topic_id = Column(BigInteger, primary_key=True, default=get_rand_id)
+    topic_id = Column(BigInteger, primary_key=True, default=get_new_id)
     title = Column(String(128), nullable=False)
     status = Column(String(64), nullable=False, default='published')
     user_id = Column(
         BigInteger, ForeignKey('users.user_id'), nullable=False)
     subforum_id = Column(
         BigInteger, ForeignKey('subforums.subforum_id'), nullable=False)
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
-    posts = relationship('Post', backref='topic', lazy=True, cascade='delete')
+    created_at = Column(DateTime(timezone=False), server_default=now())
+    updated_at = Column(DateTime(timezone=False), onupdate=now())
+    #children are deleted by nv.deletes only (see User.posts)
+    posts = relationship(
+        'Post', backref='topic', lazy=True, passive_deletes=True)
+    #denormalized activity, maintained on posts writes
+    n_posts = Column(Integer, nullable=False, default=0, server_default='0')
+    last_post_id = Column(BigInteger, nullable=True)
+    last_post_at = Column(DateTime(timezone=False), nullable=True)
+
+    #ordering indexes end with the primary key, the sorting tiebreaker
+    __table_args__ = (
+        Index('ix_topics_created_at', 'created_at', 'topic_id'),
+        Index('ix_topics_last_post_at', 'last_post_at', 'topic_id'),
+        #also serves lookups by subforum only
+        Index('ix_topics_subforum_id_last_post_at',
+            'subforum_id', 'last_post_at', 'topic_id'),
+        Index('ix_topics_subforum_id_created_at',
+            'subforum_id', 'created_at', 'topic_id'),
+        Index('ix_topics_user_id_created_at',
+            'user_id', 'created_at', 'topic_id'),
+    )
 
     #implicitly checked in endpoints
     '''@validates('user_id')
@@ -125,6 +272,43 @@ class Topic(Base):
                 'subforum id={} does not exist'.format(subforum_id))
         return subforum_id'''
 
+    @classmethod
+    def add_post_activity(cls, post):
+        '''
+        Registers newly created (and flushed) post in its topic activity.
+        '''
+        query = cls.query.filter_by(topic_id=post.topic_id)
+        query.update({
+            cls.n_posts: cls.n_posts + 1,
+            cls.last_post_id: post.post_id,
+            cls.last_post_at: post.created_at,
+        }, synchronize_session=False)
+
+    @classmethod
+    def refresh_activity(cls, topic_ids=None):
+        '''
+        Recomputes activity of topics (all of them if topic_ids is None)
+        from the posts table.
+        '''
+        posts = Post.__table__
+        match = posts.c.topic_id == cls.__table__.c.topic_id
+        n_posts = select([func.count(posts.c.post_id)]).where(match)
+        last_post_at = select([func.max(posts.c.created_at)]).where(match)
+        last_post_id = select([posts.c.post_id]).where(match)
+        last_post_id = last_post_id.order_by(
+            posts.c.created_at.desc(), posts.c.post_id.desc()).limit(1)
+        query = cls.query
+        if topic_ids is not None:
+            topic_ids = list(topic_ids)
+            if not topic_ids:
+                return
+            query = query.filter(cls.topic_id.in_(topic_ids))
+        query.update({
+            cls.n_posts: n_posts.as_scalar(),
+            cls.last_post_at: last_post_at.as_scalar(),
+            cls.last_post_id: last_post_id.as_scalar(),
+        }, synchronize_session=False)
+
 
 class Post(Base):
     VALID_STATUSES = {
@@ -134,15 +318,25 @@ class Post(Base):
 
     __tablename__ = 'posts'
 
-    post_id = Column(BigInteger, primary_key=True, default=get_rand_id)
+    post_id = Column(BigInteger, primary_key=True, default=get_new_id)
     user_id = Column(
         BigInteger, ForeignKey('users.user_id'), nullable=False)
     topic_id = Column(
         BigInteger, ForeignKey('topics.topic_id'), nullable=False)
     content = Column(Text, nullable=False, default='')
     status = Column(String(64), nullable=False, default='published')
-    created_at = Column(DateTime(timezone=False), server_default=func.now())
-    updated_at = Column(DateTime(timezone=False), onupdate=func.now())
+    created_at = Column(DateTime(timezone=False), server_default=now())
+    updated_at = Column(DateTime(timezone=False), onupdate=now())
+
+    #ordering indexes end with the primary key, the sorting tiebreaker
+    __table_args__ = (
+        Index('ix_posts_created_at', 'created_at', 'post_id'),
+        #also serve lookups by topic/user only
+        Index('ix_posts_topic_id_created_at',
+            'topic_id', 'created_at', 'post_id'),
+        Index('ix_posts_user_id_created_at',
+            'user_id', 'created_at', 'post_id'),
+    )
 
     #implicitly checked in endpoints
     '''@validates('user_id')
@@ -161,10 +355,25 @@ class Post(Base):
 
 class RevokedToken(Base):
     __tablename__ = 'revoked_tokens'
-    revoked_token_id = Column(BigInteger, primary_key=True, default=get_rand_id)
-    jti = Column(String(120))
+    revoked_token_id = Column(BigInteger, primary_key=True, default=get_new_id)
+    jti = Column(String(120), index=True)
+    #expiration time of the revoked token itself. after it, the token is
+    #rejected anyway and the entry can be pruned
+    expires_at = Column(DateTime(timezone=False), nullable=True, index=True)
+
+    @classmethod
+    def get_unexpired_jtis(cls, now=None):
+        now = dt.datetime.utcnow() if now is None else now
+        query = db.session.query(cls.jti).filter(
+            cls.expires_at.is_(None) | (cls.expires_at > now))
+        return {jti for jti, in query}
 
     @classmethod
-    def is_jti_blacklisted(cls, jti):
-        query = cls.query.filter_by(jti=jti).first()
-        return query is not None
+    def prune_expired(cls, now=None):
+        '''
+        Deletes entries of tokens that are expired.
+        Returns the number of deleted entries.
+        '''
+        now = dt.datetime.utcnow() if now is None else now
+        return cls.query.filter(cls.expires_at <= now).delete(
+            synchronize_session=False)
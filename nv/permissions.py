@@ -7,8 +7,8 @@ def _get_attributes(cls):
         if isinstance(prop, sqlalchemy.orm.ColumnProperty)}
 
 
-def _get_roles(user):
-    return {r.strip() for r in user.roles.split(',') if r.strip()}
+def _has_role(user, role):
+    return user.has_role(role)
 
 
 def _is_active(user):
@@ -16,7 +16,7 @@ def _is_active(user):
 
 
 def _is_admin(user):
-    return user is not None and 'admin' in _get_roles(user)
+    return user is not None and _has_role(user, 'admin')
 
 
 def _is_active_admin(user):
@@ -24,7 +24,7 @@ def _is_active_admin(user):
 
 
 def _is_moderator(user):
-    return user is not None and 'moderator' in _get_roles(user)
+    return user is not None and _has_role(user, 'moderator')
 
 
 def _is_active_moderator(user):
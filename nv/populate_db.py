@@ -18,7 +18,8 @@ from nv.models import (
     Topic
 )
 from nv.database import db
-from nv.util import get_datetime, flatten, generate_hash
+from nv.util import flatten, generate_hash
+from nv.datetimes import get_datetime
 from flask import current_app
 import os
 import json
@@ -139,6 +140,11 @@ def populate_db(src_path, n_threads, max_chunk_size):
         subsets = partition_dict_of_lists(data, max_chunk_size)
         for i, subset in enumerate(subsets):
             populate(subset, i+1, len(subsets), n_threads)
+        #denormalized activity of topics and users
+        print('refreshing activity...', flush=True)
+        Topic.refresh_activity()
+        User.refresh_activity()
+        db.session.commit()
 
     print('successfully populated.')
 
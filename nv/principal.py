@@ -0,0 +1,97 @@
+'''
+Authenticated user of the current request.
+'''
+
+from flask import g, current_app, abort
+from flask_jwt_extended import get_jwt_identity, get_jwt_claims
+from nv.models import User
+from nv.cache import TTLCache
+
+
+class Principal:
+    '''
+    Snapshot of the user attributes needed by permission checks,
+    so that they can be done without loading the user.
+    '''
+    __slots__ = ('user_id', 'username', 'roles_mask', 'status')
+
+    def __init__(self, user_id, username, roles_mask, status):
+        self.user_id = user_id
+        self.username = username
+        self.roles_mask = roles_mask
+        self.status = status
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.user_id, user.username, user.roles_mask, user.status)
+
+    @property
+    def roles(self):
+        return list(User.get_roles_from_mask(self.roles_mask))
+
+    def has_role(self, role):
+        return bool(self.roles_mask & User.ROLES_BITS[role])
+
+    def get_user(self):
+        '''
+        Gets the user model object itself (a query if not in session).
+        '''
+        return User.query.get(self.user_id)
+
+
+def get_user_claims(user):
+    '''
+    Claims embedded in access tokens of user.
+    Roles and status are not embedded: they may change during the lifetime
+    of tokens, so they are read from the principal (see get_principal).
+    '''
+    return {
+        'user_id': user.user_id,
+    }
+
+
+#principals by user_id, shared by requests of the worker
+_principals_cache = TTLCache()
+
+
+def _load_principal(user_id=None, username=None):
+    if user_id is not None:
+        user = User.query.get(user_id)
+        not_found_msg = 'user id={} doest not exist'.format(user_id)
+    else:
+        user = User.query.filter_by(username=username).first()
+        not_found_msg = 'user username={} doest not exist'.format(username)
+    if user is None:
+        abort(404, not_found_msg)
+    return Principal.from_user(user)
+
+
+def get_principal():
+    '''
+    Gets principal of the logged in user, resolved at most once per request.
+    The user_id claim is used as key to a per-worker cache of users
+    (tokens without it are resolved by username), so that status and
+    roles changes are seen after at most USERS_CACHE_TTL seconds.
+    '''
+    if 'principal' in g:
+        return g.principal
+    user_id = get_jwt_claims().get('user_id')
+    username = get_jwt_identity()
+    principal = None
+    if user_id is not None:
+        principal = _principals_cache.get(user_id)
+    if principal is None:
+        principal = _load_principal(user_id=user_id, username=username)
+        _principals_cache.set(principal.user_id, principal,
+            ttl=current_app.config['USERS_CACHE_TTL'])
+    g.principal = principal
+    return principal
+
+
+def invalidate_principal(user_id):
+    '''
+    Must be called on changes of users so that this worker sees them.
+    '''
+    _principals_cache.delete(user_id)
+    if 'principal' in g and g.principal.user_id == user_id:
+        g.pop('principal')
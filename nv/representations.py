@@ -0,0 +1,79 @@
+'''
+JSON representation of API responses.
+
+The fastest installed encoder is used (orjson, then ujson, then the
+standard library one), unless JSON_ENCODER names one. Output is compact
+unless the app is in debug mode.
+'''
+
+import json
+from collections import OrderedDict
+from functools import lru_cache
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _get_orjson_dumps(compact):
+    option = 0 if compact else orjson.OPT_INDENT_2
+    return lambda data: orjson.dumps(data, option=option)
+
+
+def _get_ujson_dumps(compact):
+    indent = 0 if compact else 4
+    return lambda data: ujson.dumps(
+        data, ensure_ascii=False, indent=indent).encode('utf-8')
+
+
+def _get_json_dumps(compact):
+    if compact:
+        kwargs = {'separators': (',', ':')}
+    else:
+        kwargs = {'indent': 4}
+    return lambda data: json.dumps(
+        data, ensure_ascii=False, **kwargs).encode('utf-8')
+
+
+#by order of preference
+ENCODERS = OrderedDict([
+    ('orjson', (orjson, _get_orjson_dumps)),
+    ('ujson', (ujson, _get_ujson_dumps)),
+    ('json', (json, _get_json_dumps)),
+])
+
+
+def get_available_encoders():
+    return [name for name, (module, __) in ENCODERS.items()
+        if module is not None]
+
+
+@lru_cache(maxsize=None)
+def get_dumps(name='auto', compact=True):
+    '''
+    Gets function that encodes data to JSON bytes. The preferred available
+    encoder is used if name is 'auto' or not available.
+    '''
+    available = get_available_encoders()
+    if not name in available:
+        name = available[0]
+    return ENCODERS[name][1](compact)
+
+
+def dumps(data):
+    return get_dumps(
+        current_app.config['JSON_ENCODER'], not current_app.debug)(data)
+
+
+def output_json(data, code, headers=None):
+    resp = current_app.response_class(
+        dumps(data), status=code, mimetype='application/json')
+    resp.headers.extend(headers or {})
+    return resp
@@ -16,10 +16,13 @@ from nv.util import (
     mk_message,
     verify_hash,
 )
-from nv.models import User, RevokedToken
+from nv.models import User
+from nv.revoked_tokens import revoked_tokens
 from nv.schemas import UserSchema
 from nv.database import db
 from nv.extensions import jwt
+from nv.principal import get_user_claims
+import datetime as dt
 
 
 class Login(Resource):
@@ -38,8 +41,8 @@ class Login(Resource):
             return mk_errors(400, 'email or username are required')
         if user is None or not verify_hash(args['password'], user.password):
             return mk_errors(400, 'invalid credentials')
-        access_tok = create_access_token(identity=user.username)
-        refresh_tok = create_refresh_token(identity=user.username)
+        access_tok = create_access_token(identity=user)
+        refresh_tok = create_refresh_token(identity=user)
         return {
             'access_token': access_tok,
             'refresh_token': refresh_tok,
@@ -52,15 +55,29 @@ class TokenRefresh(Resource):
         '''
         Refresh access token.
         '''
-        current_user = get_jwt_identity()
-        access_token = create_access_token(identity=current_user)
+        username = get_jwt_identity()
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            return mk_errors(401, 'user does not exist anymore')
+        access_token = create_access_token(identity=user)
         return {'access_token': access_token}, 200
 
 
+@jwt.user_identity_loader
+def user_identity(user):
+    #tokens may also be created directly from usernames
+    return user if isinstance(user, str) else user.username
+
+
+@jwt.user_claims_loader
+def user_claims(user):
+    return {} if isinstance(user, str) else get_user_claims(user)
+
+
 @jwt.token_in_blacklist_loader
 def check_if_token_in_blacklist(decrypted_token):
     jti = decrypted_token['jti']
-    return RevokedToken.is_jti_blacklisted(jti)
+    return revoked_tokens.is_revoked(jti)
 
 
 class LogoutAccess(Resource):
@@ -69,10 +86,12 @@ class LogoutAccess(Resource):
         '''
         Revoke access token.
         '''
-        jti = get_raw_jwt()['jti']
+        raw_jwt = get_raw_jwt()
+        jti = raw_jwt['jti']
+        exp = raw_jwt.get('exp')
+        expires_at = None if exp is None else dt.datetime.utcfromtimestamp(exp)
         try:
-            revoked_token = RevokedToken(jti=jti)
-            revoked_token.save()
+            revoked_tokens.revoke(jti, expires_at=expires_at)
             return '', 204
         except Exception as e:
             print('WTF: {}'.format(e))
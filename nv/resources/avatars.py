@@ -4,7 +4,6 @@ from flask_restful import (
 )
 from flask_jwt_extended import (
     jwt_required,
-    get_jwt_identity,
 )
 from webargs.flaskparser import parser
 from webargs.fields import (
@@ -27,14 +26,21 @@ from nv.permissions import (
     DeleteAvatar,
 )
 from nv.database import db
+from nv.serializers import (
+    AVATAR_SERIALIZER,
+)
+from nv.principal import get_principal
+from nv.response_cache import (
+    invalidate,
+)
 from nv.resources.common import (
     parse_get_coll_args,
+    get_avatar_scopes,
     generic_get_coll,
     generic_get,
     generic_post,
     generic_put,
     generic_delete,
-    get_user,
     get_obj,
     check_permissions,
 )
@@ -51,7 +57,7 @@ class AvatarsRes(Resource):
 
     @jwt_required
     def post(self):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         check_permissions(user, [
             CreateAvatar(),
         ])
@@ -66,25 +72,29 @@ class AvatarRes(Resource):
         ret = generic_get(
             obj=Avatar.query.get(avatar_id),
             schema=AvatarSchema(),
+            serializer=AVATAR_SERIALIZER,
         )
         return ret
 
     @jwt_required
     def delete(self, avatar_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         avatar = get_obj(Avatar.query.filter_by(avatar_id=avatar_id),
             'avatar does not exist')
         check_permissions(user, [
             DeleteAvatar(avatar),
         ])
+        #users of avatar are left without it
+        scopes = get_avatar_scopes(avatar.avatar_id)
         ret = generic_delete(
             obj=Avatar.query.get(avatar_id),
         )
+        invalidate(*scopes)
         return ret
 
     @jwt_required
     def put(self, avatar_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         avatar = get_obj(Avatar.query.filter_by(avatar_id=avatar_id),
             'avatar does not exist')
         check_permissions(user, [
@@ -95,4 +105,5 @@ class AvatarRes(Resource):
             schema=AvatarSchema(),
             data=request.form
         )
+        invalidate(*get_avatar_scopes(avatar.avatar_id))
         return ret
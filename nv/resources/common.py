@@ -3,49 +3,100 @@ from webargs.flaskparser import parser
 from webargs.fields import (
     Str,
     Int,
+    Bool,
     DelimitedList,
 )
 from marshmallow import (
     ValidationError,
 )
-from sqlalchemy import exc, desc, select, func
+from sqlalchemy import (
+    exc,
+    select,
+    func,
+    and_,
+    or_,
+    false,
+    inspect,
+    DateTime,
+)
 from webargs import validate
 from nv.models import (
+    Avatar,
     User,
+    Subforum,
     Topic,
     Post,
 )
 from nv.schemas import (
+    UserSchema,
     TopicSchema,
 )
+from nv.serializers import (
+    AVATAR_SERIALIZER,
+    USER_REF_SERIALIZER,
+    get_expanded_serializer,
+)
+from sqlalchemy.orm import load_only, joinedload
 from flask import abort
-from flask import current_app
+from flask import current_app, stream_with_context
 from nv.util import (
     filter_fields,
     mk_errors,
     fmt_validation_error_messages,
-    get_now,
-    get_datetime,
 )
+from nv.datetimes import get_now, get_datetime
 from nv.database import db
+from nv.cache import (
+    TTLCache,
+    get_shared_cache,
+    is_shared_cache_distributed,
+)
+from nv.representations import dumps
+from nv.conditional import (
+    get_etag,
+    get_state_values,
+    get_last_modified,
+    set_validators,
+    get_not_modified_response,
+)
+from nv.response_cache import (
+    get_user_scope,
+    get_subforum_scope,
+)
 from nv.permissions import BypassAntiFlood
+import datetime as dt
+import base64
+import json
 
 
 def crop_query(query, offset=None, max_n_results=None):
+    '''
+    Gets up to max_n_results objects from query, along with the offset of
+    the next page (None if there are no more objects).
+    One extra object is fetched to know if there are more objects.
+    '''
     if offset is not None:
         query = query.offset(offset)
-    if query.count() <= max_n_results:
-        new_offset = None
-    else:
-        new_offset = (0 if offset is None else offset) + max_n_results
-    if max_n_results is not None:
-        query = query.limit(max_n_results)
-    return query, new_offset
+    if max_n_results is None:
+        return query.all(), None
+    objs = query.limit(max_n_results + 1).all()
+    if len(objs) <= max_n_results:
+        return objs, None
+    new_offset = (0 if offset is None else offset) + max_n_results
+    return objs[:max_n_results], new_offset
 
 
 DEF_MAX_N_RESULTS = 2048
 
 
+#maximum number of ids of multi-get requests (?ids=1,2,3)
+MAX_N_IDS = 256
+
+
+#number of objects fetched and dumped at a time by streamed collections
+STREAM_BATCH_SIZE = 256
+
+
 ORDER_BY_OPTIONS = [
     'newest',
     'oldest',
@@ -56,16 +107,39 @@ ORDER_BY_OPTIONS = [
 ORDER_TOPICS_OPTIONS = ORDER_BY_OPTIONS + ['newest_last_post']
 
 
+TOTAL_MODE_OPTIONS = [
+    'exact',
+    'cached',
+]
+
+
 DEF_GET_COLL_ARGS = {
     'fields': DelimitedList(Str()),
     'offset': Int(validate=lambda n: n >= 0),
+    'cursor': Str(),
     'max_n_results': Int(validate=lambda n: n >= 0, missing=DEF_MAX_N_RESULTS),
     'order': Str(
         validate=validate.OneOf(ORDER_BY_OPTIONS), missing='newest'),
+    'with_total': Bool(missing=True),
+    'total_mode': Str(
+        validate=validate.OneOf(TOTAL_MODE_OPTIONS), missing='exact'),
+    'stream': Bool(missing=False),
+    #nested objects to be dumped, all of them if not set
+    'expand': DelimitedList(Str()),
 }
 
 
-GET_TOPICS_ARGS = DEF_GET_COLL_ARGS.copy()
+#collections of objects that can be gotten by ids
+MULTI_GET_COLL_ARGS = DEF_GET_COLL_ARGS.copy()
+MULTI_GET_COLL_ARGS.update({
+    'ids': DelimitedList(Int(), validate=lambda ids: len(ids) <= MAX_N_IDS),
+})
+
+
+GET_POSTS_ARGS = MULTI_GET_COLL_ARGS.copy()
+
+
+GET_TOPICS_ARGS = MULTI_GET_COLL_ARGS.copy()
 GET_TOPICS_ARGS.update({
     'order': Str(validate=validate.OneOf(ORDER_TOPICS_OPTIONS),
         missing='newest_last_post'),
@@ -73,37 +147,148 @@ GET_TOPICS_ARGS.update({
 })
 
 
+GET_USERS_ARGS = MULTI_GET_COLL_ARGS.copy()
+GET_USERS_ARGS.update({
+    'roles': DelimitedList(Str(validate=validate.OneOf(list(User.ROLES_BITS)))),
+    'statuses': DelimitedList(Str(validate=validate.OneOf(
+        sorted(User.VALID_STATUSES)))),
+})
+
+
 def parse_get_coll_args(req, args=DEF_GET_COLL_ARGS,
         locations=('querystring', 'form')):
     args = parser.parse(args, req, locations=locations)
     return args
 
 
+#pages of compound documents, which are always fully dumped
+GET_PAGE_ARGS = {k: v for k, v in DEF_GET_COLL_ARGS.items()
+    if not k in {'fields', 'stream', 'expand'}}
+
+
+def parse_get_posts_args(req):
+    return parse_get_coll_args(req, args=GET_POSTS_ARGS)
+
+
 def parse_get_topics_args(req):
     return parse_get_coll_args(req, args=GET_TOPICS_ARGS)
 
 
-def order_query(query, by='newest', date_field='created_at'):
-    assert by in ORDER_BY_OPTIONS
+def parse_get_users_args(req):
+    return parse_get_coll_args(req, args=GET_USERS_ARGS)
+
+
+def _get_model(query):
+    return query.column_descriptions[0]['entity']
+
+
+def get_order_keys(model, by='newest', date_field='created_at'):
+    '''
+    Gets list of (column, descending, nullable) sorting keys.
+    The primary key is always the last key, so that the order is total.
+    '''
+    pk = inspect(model).primary_key[0]
     if by == 'newest':
-        key = desc('{}'.format(date_field))
+        return [(getattr(model, date_field), True, False), (pk, True, False)]
     elif by == 'oldest':
-        key = '{}'.format(date_field)
+        return [(getattr(model, date_field), False, False), (pk, False, False)]
+    elif by == 'newest_last_post':
+        return [(model.last_post_at, True, True), (pk, True, False)]
     elif by is None:
-        return query
-    else:
-        raise ValueError('"by" must be in {}'.format(ORDER_BY_OPTIONS))
-    query = query.order_by(key)
+        return [(pk, False, False)]
+    raise ValueError('"by" must be in {}'.format(ORDER_TOPICS_OPTIONS))
+
+
+def order_query(query, by='newest', date_field='created_at'):
+    keys = get_order_keys(_get_model(query), by, date_field)
+    query = query.order_by(*[k.desc() if d else k for k, d, __ in keys])
     return query
 
 
-def order_topics(query, by='newest_last_post'):
-    if by == 'newest_last_post':
-        sel = select([func.max(Post.created_at)])
-        scalar = sel.where(Post.topic_id == Topic.topic_id).as_scalar()
-        query = query.order_by(scalar.desc())
-        by = None
-    return order_query(query, by=by)
+def _nulls_are_smallest():
+    return db.engine.dialect.name in {'sqlite', 'mysql'}
+
+
+def _after_key(key, descending, nullable, value):
+    '''
+    Gets (strictly after, equal) conditions for a single sorting key.
+    '''
+    nulls_last = nullable and descending == _nulls_are_smallest()
+    if value is None:
+        strict = false() if nulls_last else key.isnot(None)
+        return strict, key.is_(None)
+    strict = key < value if descending else key > value
+    if nulls_last:
+        strict = or_(strict, key.is_(None))
+    return strict, key == value
+
+
+def filter_after_cursor(query, keys, values):
+    '''
+    Keeps only rows that come strictly after the row with given key values.
+    '''
+    conds = []
+    prev_eqs = []
+    for (key, descending, nullable), value in zip(keys, values):
+        strict, eq = _after_key(key, descending, nullable, value)
+        conds.append(and_(*prev_eqs, strict))
+        prev_eqs.append(eq)
+    return query.filter(or_(*conds))
+
+
+def _encode_value(value):
+    if isinstance(value, dt.datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value, key, nullable):
+    '''
+    Decodes the value of a sorting key, raising ValueError if its type
+    does not match the key.
+    '''
+    if value is None and nullable:
+        return None
+    if isinstance(key.type, DateTime):
+        if not isinstance(value, dict) or not isinstance(value.get('dt'), str):
+            raise ValueError('expected datetime')
+        return get_datetime(value['dt']).replace(tzinfo=None)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise ValueError('expected integer')
+    return value
+
+
+def encode_cursor(order, values):
+    cursor = json.dumps([order, [_encode_value(v) for v in values]])
+    return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, order, keys):
+    try:
+        cursor = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        cursor_order, values = json.loads(cursor.decode('utf-8'))
+        #values of cursors from other orders are not checked against keys
+        if cursor_order == order:
+            if len(values) != len(keys):
+                raise ValueError('expected {} values'.format(len(keys)))
+            values = [_decode_value(v, k, n)
+                for v, (k, __, n) in zip(values, keys)]
+    except Exception:
+        abort(400, 'invalid cursor')
+    if cursor_order != order:
+        abort(400, 'cursor does not match order "{}"'.format(order))
+    return values
+
+
+def get_key_values(obj, keys):
+    return [getattr(obj, k.key) for k, __, __ in keys]
+
+
+def filter_by_ids(query, ids=None):
+    if ids is not None:
+        pk = inspect(_get_model(query)).primary_key[0]
+        query = query.filter(pk.in_(ids))
+    return query
 
 
 def filter_topics_by_statuses(query, statuses=None):
@@ -112,50 +297,444 @@ def filter_topics_by_statuses(query, statuses=None):
     return query
 
 
+def filter_users_by_roles(query, roles=None):
+    '''
+    Keeps users with any of roles.
+    '''
+    if roles is not None:
+        masks = User.get_masks_with_any_role(roles)
+        query = query.filter(User.roles_mask.in_(masks))
+    return query
+
+
+def filter_users_by_statuses(query, statuses=None):
+    if statuses is not None:
+        query = query.filter(User.status.in_(statuses))
+    return query
+
+
+def get_topics_last_posts(topics):
+    '''
+    Gets last post of each topic in a single query, to be passed as
+    context to TopicSchema.
+    '''
+    post_ids = {t.last_post_id for t in topics if t.last_post_id is not None}
+    if not post_ids:
+        return {'last_posts': {}}
+    query = Post.query.filter(Post.post_id.in_(post_ids))
+    query = query.options(joinedload('user').joinedload('avatar'))
+    return {'last_posts': {p.post_id: p for p in query}}
+
+
+def get_subforums_n_topics(subforums):
+    '''
+    Gets number of topics of each subforum in a single query, to be passed
+    as context to SubforumSchema.
+    '''
+    subforum_ids = {s.subforum_id for s in subforums}
+    if not subforum_ids:
+        return {'n_topics': {}}
+    query = db.session.query(Topic.subforum_id, func.count(Topic.topic_id))
+    query = query.filter(Topic.subforum_id.in_(subforum_ids))
+    return {'n_topics': dict(query.group_by(Topic.subforum_id))}
+
+
+def get_topics_subforums_n_topics(topics):
+    return get_subforums_n_topics({t.subforum for t in topics})
+
+
+def get_posts_topics_context(posts):
+    topics = {p.topic for p in posts}
+    context = get_topics_last_posts(topics)
+    context.update(get_topics_subforums_n_topics(topics))
+    return context
+
+
+class LoadingProfile:
+    '''
+    Declares how to load, along with a page of objects, what is needed to
+    dump each of their fields: loader options for nested relationships and
+    functions that get from the page the schema context of computed fields.
+    Only what is needed by the fields to be dumped is loaded.
+    '''
+    def __init__(self, options=None, context_getters=None):
+        self.options = options or {}
+        self.context_getters = context_getters or {}
+
+    def apply(self, query, fields):
+        for field in fields:
+            query = query.options(*self.options.get(field, []))
+        return query
+
+    def get_context(self, objs, fields):
+        context = {}
+        for field in fields:
+            if field in self.context_getters:
+                context.update(self.context_getters[field](objs))
+        return context
+
+
+_USER_WITH_AVATAR = joinedload('user').joinedload('avatar')
+
+
+USERS_LOADING_PROFILE = LoadingProfile(
+    options={
+        'avatar': [joinedload('avatar')],
+    },
+)
+
+
+SUBFORUMS_LOADING_PROFILE = LoadingProfile(
+    context_getters={
+        'n_topics': get_subforums_n_topics,
+    },
+)
+
+
+TOPICS_LOADING_PROFILE = LoadingProfile(
+    options={
+        'user': [_USER_WITH_AVATAR],
+        'subforum': [joinedload('subforum')],
+    },
+    context_getters={
+        'subforum': get_topics_subforums_n_topics,
+        'last_post': get_topics_last_posts,
+    },
+)
+
+
+POSTS_LOADING_PROFILE = LoadingProfile(
+    options={
+        'user': [_USER_WITH_AVATAR],
+        'topic': [
+            joinedload('topic').joinedload('user').joinedload('avatar'),
+            joinedload('topic').joinedload('subforum'),
+        ],
+    },
+    context_getters={
+        'topic': get_posts_topics_context,
+    },
+)
+
+
+def get_dump_fields(schema):
+    return {k for k, f in schema.fields.items() if not f.load_only}
+
+
+def project_schema(schema, fields=None):
+    '''
+    Gets a copy of schema that dumps only given fields.
+    '''
+    if fields is None:
+        return schema
+    only = set(fields) & get_dump_fields(schema)
+    return schema.__class__(
+        many=schema.many, only=only, exclude=schema.exclude,
+        context=schema.context)
+
+
+def get_fields_columns(model, schema, fields):
+    '''
+    Gets names of model columns needed to dump given fields with schema.
+    '''
+    mapper = inspect(model)
+    extra_columns = getattr(schema, 'fields_columns', {})
+    columns = set()
+    for field in fields:
+        if field in mapper.column_attrs:
+            columns.add(field)
+        elif field in mapper.relationships:
+            columns.update(
+                c.key for c in mapper.relationships[field].local_columns)
+        columns.update(extra_columns.get(field, []))
+    return columns
+
+
+def project_query(query, schema, fields, keys=()):
+    '''
+    Loads only the columns needed to dump fields and to get sorting keys.
+    '''
+    model = _get_model(query)
+    columns = get_fields_columns(model, schema, fields)
+    columns.update(k.key for k, __, __ in keys)
+    return query.options(load_only(*columns))
+
+
+_totals_cache = TTLCache()
+
+
+def get_total(query, mode='exact'):
+    '''
+    Counts query results. In 'cached' mode, counts are kept per worker for
+    TOTALS_CACHE_TTL seconds.
+    '''
+    if mode == 'exact':
+        return query.count()
+    stmt = query.statement.compile()
+    key = (str(stmt), tuple(sorted(stmt.params.items())))
+    total = _totals_cache.get(key)
+    if total is None:
+        total = query.count()
+        _totals_cache.set(key, total, current_app.config['TOTALS_CACHE_TTL'])
+    return total
+
+
+def get_next_cursor(order, new_offset, last_values):
+    if new_offset is None or last_values is None:
+        return None
+    return encode_cursor(order, last_values)
+
+
+def stream_coll(query, dump, get_last_values, total=None,
+        offset=None, cursor=None, max_n_results=None, order='newest',
+        batch_size=STREAM_BATCH_SIZE):
+    '''
+    Gets the JSON of a collection as chunks, fetching and dumping objects
+    batch_size at a time. offset and next_cursor come after data, as they
+    are only known once all objects are fetched.
+    '''
+    if offset is not None:
+        query = query.offset(offset)
+    if max_n_results is not None:
+        query = query.limit(max_n_results + 1)
+    yield b'{"total":' + dumps(total) + b',"data":['
+    n_objs = 0
+    last_values = None
+    has_more = False
+    sep = b''
+    batch = []
+    for obj in query.yield_per(batch_size):
+        if n_objs == max_n_results:
+            has_more = True
+            break
+        batch.append(obj)
+        n_objs += 1
+        if len(batch) == batch_size:
+            yield sep + b','.join(dumps(d) for d in dump(batch))
+            sep = b','
+            last_values = get_last_values(batch[-1])
+            batch = []
+    if batch:
+        yield sep + b','.join(dumps(d) for d in dump(batch))
+        last_values = get_last_values(batch[-1])
+    new_offset = (offset or 0) + max_n_results if has_more else None
+    next_cursor = get_next_cursor(order, new_offset, last_values)
+    if cursor is not None:
+        new_offset = None
+    yield b'],"offset":' + dumps(new_offset) \
+        + b',"next_cursor":' + dumps(next_cursor) + b'}'
+
+
 def generic_get_coll(
         full_query, schema,
-        offset=None, max_n_results=None, fields=None, order='newest'):
-    total = full_query.count()
+        offset=None, cursor=None, max_n_results=None, fields=None,
+        order='newest', with_total=True, total_mode='exact',
+        loading_profile=None, serializer=None, stream=False, ids=None,
+        expand=None, compound=None):
+    '''
+    If serializer is set, it is used instead of schema to dump objects
+    when all fields are requested. Either way, a matching conditional
+    request gets a 304 response before any serialization.
+    If stream is set, the response is written as objects are fetched,
+    so that memory use does not depend on max_n_results.
+    If ids is set, only objects with these primary keys are gotten.
+    If expand is set (e.g. ['user', 'topic.subforum']), only these nested
+    objects are loaded and dumped, the others being dumped as their ids.
+    It requires serializer (objects without one have nothing to expand).
+    If compound is set, it is called with the selected rows to select the
+    other objects of a compound document. It returns their rows, which are
+    part of the validators, and a function that dumps them as a dict merged
+    into the response. It requires serializer.
+    '''
+    if offset is not None and cursor is not None:
+        abort(400, 'offset and cursor are mutually exclusive')
+    full_query = filter_by_ids(full_query, ids)
+    total = get_total(full_query, total_mode) if with_total else None
+    keys = get_order_keys(_get_model(full_query), order)
+    if cursor is not None:
+        full_query = filter_after_cursor(
+            full_query, keys, decode_cursor(cursor, order, keys))
+    if expand is not None:
+        expand = [p for p in expand if p]
+        if expand and serializer is None:
+            abort(400, 'expand is not supported by this resource')
+    if expand is not None and serializer is not None:
+        try:
+            serializer = get_expanded_serializer(serializer.entity, expand)
+        except ValueError as e:
+            abort(400, str(e))
+        compiled = True
+    else:
+        compiled = serializer is not None and fields is None
+    if compiled:
+        #sorting keys values are selected after serializer columns
+        full_query = serializer.apply(
+            full_query, extra_columns=[k for k, __, __ in keys])
+        get_last_values = lambda row: row[-len(keys):]
+        dump = lambda rows: filter_fields(serializer.dump_all(rows), fields)
+    else:
+        schema = project_schema(schema, fields)
+        dump_fields = get_dump_fields(schema)
+        if fields is not None:
+            full_query = project_query(full_query, schema, dump_fields, keys)
+        if loading_profile is not None:
+            full_query = loading_profile.apply(full_query, dump_fields)
+        get_last_values = lambda obj: get_key_values(obj, keys)
+        def set_context(objs):
+            if loading_profile is not None:
+                schema.context.update(
+                    loading_profile.get_context(objs, dump_fields))
+        def dump(objs):
+            set_context(objs)
+            return filter_fields(schema.dump(objs), fields)
     full_query = order_query(full_query, order)
-    query, new_offset = crop_query(full_query, offset, max_n_results)
-    objs = query.all()
-    data = schema.dump(objs)
-    data = filter_fields(data, fields)
-    return {
+    if stream:
+        chunks = stream_coll(full_query, dump, get_last_values,
+            total=total, offset=offset, cursor=cursor,
+            max_n_results=max_n_results, order=order,
+            batch_size=STREAM_BATCH_SIZE)
+        return current_app.response_class(
+            stream_with_context(chunks), mimetype='application/json')
+    objs, new_offset = crop_query(full_query, offset, max_n_results)
+    last_values = get_last_values(objs[-1]) if objs else None
+    next_cursor = get_next_cursor(order, new_offset, last_values)
+    if cursor is not None:
+        new_offset = None
+    dump_compound = None
+    if compiled:
+        rows = [tuple(r) for r in objs]
+        compound_rows = []
+        if compound is not None:
+            compound_rows, dump_compound = compound(objs)
+        set_validators(
+            get_etag(total, new_offset, next_cursor, rows, compound_rows),
+            get_last_modified(rows + compound_rows))
+        not_modified = get_not_modified_response()
+        if not_modified is not None:
+            return not_modified
+        data = dump(rows)
+    else:
+        set_context(objs)
+        set_validators(get_etag(total, new_offset, next_cursor,
+            get_state_values(objs), get_state_values(schema.context)))
+        not_modified = get_not_modified_response()
+        if not_modified is not None:
+            return not_modified
+        data = filter_fields(schema.dump(objs), fields)
+    ret = {
         'total': total,
         'offset': new_offset,
+        'next_cursor': next_cursor,
         'data': data,
     }
+    if dump_compound is not None:
+        ret.update(dump_compound())
+    return ret
+
+
+def select_included_users(user_ids):
+    '''
+    Selects rows of users and of their avatars, to be included once in
+    compound documents in which objects reference users by id.
+    '''
+    user_ids = {u for u in user_ids if u is not None}
+    users = []
+    if user_ids:
+        users = USER_REF_SERIALIZER.apply(
+            User.query.filter(User.user_id.in_(user_ids))).all()
+    avatar_ids = {u.avatar_id for u in users if u.avatar_id is not None}
+    avatars = []
+    if avatar_ids:
+        avatars = AVATAR_SERIALIZER.apply(
+            Avatar.query.filter(Avatar.avatar_id.in_(avatar_ids))).all()
+    return [tuple(u) for u in users], [tuple(a) for a in avatars]
+
+
+def dump_included_users(users, avatars):
+    '''
+    Dumps rows of select_included_users as maps by id.
+    '''
+    return {
+        'users': {u['user_id']: u
+            for u in USER_REF_SERIALIZER.dump_all(users)},
+        'avatars': {a['avatar_id']: a
+            for a in AVATAR_SERIALIZER.dump_all(avatars)},
+    }
 
 
-def get_topics(full_query, order='newest_last_post', statuses=None, **kwargs):
+def get_topics(full_query, order='newest_last_post', statuses=None,
+        loading_profile=TOPICS_LOADING_PROFILE, serializer=None, **kwargs):
     query = filter_topics_by_statuses(full_query, statuses)
-    query = order_topics(query, by=order)
     return generic_get_coll(
-        query, schema=TopicSchema(many=True), order=None, **kwargs)
+        query, schema=TopicSchema(many=True), order=order,
+        loading_profile=loading_profile, serializer=serializer, **kwargs)
 
 
-def generic_get(obj, schema):
+def get_users(full_query, roles=None, statuses=None,
+        loading_profile=USERS_LOADING_PROFILE, serializer=None, **kwargs):
+    query = filter_users_by_roles(full_query, roles)
+    query = filter_users_by_statuses(query, statuses)
+    return generic_get_coll(
+        query, schema=UserSchema(many=True),
+        loading_profile=loading_profile, serializer=serializer, **kwargs)
+
+
+def generic_get(obj, schema, serializer=None, on_dump=None):
+    '''
+    If serializer is set, obj is dumped with it from a single row query
+    and a matching conditional request gets a 304 response before any
+    serialization.
+    on_dump(obj, data), if set, completes data dumped with schema before
+    validators are computed from it (serializer must not be set).
+    '''
+    assert serializer is None or on_dump is None
     if obj is None:
         return mk_errors(404, 'element does not exist')
-    data = schema.dump(obj)
+    if serializer is not None:
+        model = obj.__class__
+        pk = inspect(model).primary_key[0]
+        query = model.query.filter(pk == getattr(obj, pk.key))
+        row = tuple(serializer.apply(query).one())
+        set_validators(get_etag(row), get_last_modified([row]))
+        not_modified = get_not_modified_response()
+        if not_modified is not None:
+            return not_modified
+        data = serializer.dump(row)
+    else:
+        data = schema.dump(obj)
+        if on_dump is not None:
+            on_dump(obj, data)
+        set_validators(get_etag(data))
+        not_modified = get_not_modified_response()
+        if not_modified is not None:
+            return not_modified
     ret = {
         'data': data,
     }
     return ret
 
 
-def generic_post(schema, data):
+def generic_post(schema, data, on_add=None, on_commit=None):
+    '''
+    on_add(obj), if set, is called after obj is flushed and before commit,
+    so any related updates happen in the same transaction.
+    on_commit(obj), if set, is called after a successful commit.
+    '''
     try:
         obj = schema.load(data)
     except ValidationError as e:
         return mk_errors(400, fmt_validation_error_messages(e.messages))
     try:
         db.session.add(obj)
+        if on_add is not None:
+            db.session.flush()
+            on_add(obj)
         db.session.commit()
     except exc.IntegrityError as e:
         db.session.rollback()
         return mk_errors(400, '{}'.format(e.args))
+    if on_commit is not None:
+        on_commit(obj)
     ret = {
         'data': schema.dump(obj),
     }
@@ -180,10 +759,25 @@ def generic_put(obj, schema, data):
     return ret
 
 
-def generic_delete(obj):
+def generic_delete(obj, on_delete=None, delete=None):
+    '''
+    on_delete(obj), if set, is called after obj deletion is flushed and
+    before commit, so any related updates happen in the same transaction.
+    delete(obj), if set, deletes obj instead of the session
+    (e.g. with set-based deletes of its children, see nv.deletes).
+    It must be set for users, subforums and topics, whose children are
+    never deleted by the session.
+    '''
     if obj is None:
         return mk_errors(404, 'element does not exist')
-    db.session.delete(obj)
+    assert delete is not None or not isinstance(obj, (User, Subforum, Topic))
+    if delete is not None:
+        delete(obj)
+    else:
+        db.session.delete(obj)
+    if on_delete is not None:
+        db.session.flush()
+        on_delete(obj)
     db.session.commit()
     return '', 204
 
@@ -213,13 +807,141 @@ def check_permissions(user, permissions):
         permission.check(user)
 
 
+#user columns with the last creation time of posts/topics
+_LAST_POSTED_AT_COLUMNS = {
+    Post: User.last_posted_at,
+    Topic: User.last_topic_created_at,
+}
+
+
+def _get_last_posted_at_key(user_id, model_cls):
+    return 'last_posted_at/{}/{}'.format(model_cls.__tablename__, user_id)
+
+
+def get_last_posted_at(user_id, model_cls):
+    '''
+    Gets last creation time of posts/topics by user (None if never),
+    from the shared cache or else from the users table.
+    The cache is only used if it is distributed: per worker caches would
+    miss posts/topics created via other workers.
+    '''
+    distributed = is_shared_cache_distributed()
+    if distributed:
+        cache = get_shared_cache()
+        key = _get_last_posted_at_key(user_id, model_cls)
+        timestamp = cache.get(key)
+        if timestamp is not None:
+            return None if not timestamp else get_datetime(timestamp)
+    column = _LAST_POSTED_AT_COLUMNS[model_cls]
+    last_posted_at = db.session.query(column).filter(
+        User.user_id == user_id).scalar()
+    if distributed:
+        #0 stands for never
+        timestamp = 0 if last_posted_at is None \
+            else get_datetime(last_posted_at).timestamp()
+        cache.set(key, timestamp,
+            timeout=current_app.config['LAST_POSTED_AT_CACHE_TTL'])
+    return None if last_posted_at is None else get_datetime(last_posted_at)
+
+
+def set_last_posted_at(obj):
+    '''
+    Updates the shared cache after the creation of post/topic obj.
+    '''
+    if not is_shared_cache_distributed():
+        return
+    cache = get_shared_cache()
+    key = _get_last_posted_at_key(obj.user_id, obj.__class__)
+    cache.set(key, get_datetime(obj.created_at).timestamp(),
+        timeout=current_app.config['LAST_POSTED_AT_CACHE_TTL'])
+
+
+def get_topic_scopes(subforum_id, topic_id=None):
+    '''
+    Response cache scopes depending on topic.
+    '''
+    scopes = ['subforums', 'topics', 'subforum/{}/topics'.format(subforum_id)]
+    if topic_id is not None:
+        scopes.append('topic/{}/posts'.format(topic_id))
+    return scopes
+
+
+def get_topics_deletion_scopes(condition):
+    '''
+    Response cache scopes depending on topics matching condition, on their
+    subforums and on authors of topics and of their posts (whose counters
+    change). Must be gotten before deletion.
+    '''
+    topics = db.session.query(
+        Topic.topic_id, Topic.subforum_id, Topic.user_id).filter(condition)
+    topics_ids = select([Topic.topic_id]).where(condition)
+    authors_ids = db.session.query(Post.user_id).filter(
+        Post.topic_id.in_(topics_ids)).distinct()
+    scopes = {get_user_scope(u) for u, in authors_ids}
+    for topic in topics:
+        scopes.update(get_topic_scopes(topic.subforum_id, topic.topic_id))
+        scopes.add(get_subforum_scope(topic.subforum_id))
+        scopes.add(get_user_scope(topic.user_id))
+    return sorted(scopes)
+
+
+def get_user_deletion_scopes(user_id):
+    '''
+    Response cache scopes depending on user, on its topics and on the
+    topics it posted in. Must be gotten before deletion.
+    '''
+    scopes = set(get_topics_deletion_scopes(Topic.user_id == user_id))
+    topics_ids = db.session.query(Post.topic_id).filter(
+        Post.user_id == user_id)
+    topics = db.session.query(Topic.topic_id, Topic.subforum_id).filter(
+        Topic.topic_id.in_(topics_ids))
+    for topic in topics:
+        scopes.update(get_post_scopes(topic))
+    scopes.add(get_user_scope(user_id))
+    return sorted(scopes)
+
+
+def get_avatar_scopes(avatar_id):
+    '''
+    Response cache scopes depending on avatar (nested in its users).
+    '''
+    users_ids = db.session.query(User.user_id).filter(
+        User.avatar_id == avatar_id)
+    return [get_user_scope(u) for u, in users_ids]
+
+
+def get_post_scopes(topic):
+    '''
+    Response cache scopes depending on posts of topic.
+    '''
+    return [
+        'topics',
+        'subforum/{}/topics'.format(topic.subforum_id),
+        'topic/{}/posts'.format(topic.topic_id),
+    ]
+
+
+def add_post_activity(post):
+    Topic.add_post_activity(post)
+    User.add_post_activity(post)
+
+
+def remove_post_activity(post):
+    Topic.refresh_activity([post.topic_id])
+    User.remove_post_activity(post)
+
+
+def add_topic_activity(topic):
+    User.add_topic_activity(topic)
+
+
 def check_post_time_interval(user, model_cls):
     if BypassAntiFlood.is_granted(user):
         return
-    last_post = order_query(
-        model_cls.query.filter_by(user_id=user.user_id), by='newest').first()
-    if last_post is None:
+    #kept on deletes on purpose: deleted posts/topics count for anti-flood
+    last_posted_at = get_last_posted_at(user.user_id, model_cls)
+    if last_posted_at is None:
         return
-    diff_secs = (get_now() - get_datetime(last_post.created_at)).total_seconds()
+    diff_secs = (get_now() - last_posted_at).total_seconds()
     if int(diff_secs) < current_app.config['MIN_POST_TIME_INTERVAL']:
         raise TooManyRequests('not outside minimum time interval for posting')
@@ -4,7 +4,6 @@ from flask_restful import (
 )
 from flask_jwt_extended import (
     jwt_required,
-    get_jwt_identity,
 )
 from nv.models import (
     User,
@@ -12,20 +11,24 @@ from nv.models import (
 from nv.schemas import (
     UserSchema,
 )
+from nv.principal import get_principal
 from nv.resources.common import (
     generic_get,
-    get_user,
 )
 
 
+def _add_email(user, data):
+    #user themselves are allowed to see their emails
+    data['email'] = str(user.email)
+
+
 class MeRes(Resource):
     @jwt_required
     def get(self):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal().get_user()
         ret = generic_get(
             obj=user,
             schema=UserSchema(),
+            on_dump=_add_email,
         )
-        #user themselves are allowed to see their emails
-        ret['data']['email'] = str(user.email)
         return ret
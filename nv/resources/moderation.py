@@ -0,0 +1,131 @@
+from flask import request
+from flask_restful import (
+    Resource,
+)
+from flask_jwt_extended import (
+    jwt_required,
+)
+from webargs.flaskparser import parser
+from webargs.fields import (
+    Str,
+    Int,
+    DelimitedList,
+)
+from webargs import validate
+from nv.models import (
+    Subforum,
+    Topic,
+    Post,
+)
+from nv.util import (
+    mk_errors,
+)
+from nv.permissions import (
+    EditPost,
+    EditTopic,
+)
+from nv.database import db
+from nv.principal import get_principal
+from nv.response_cache import (
+    invalidate,
+    get_subforum_scope,
+    GLOBAL_SCOPE,
+)
+from nv.resources.common import (
+    get_obj,
+    get_user,
+    check_permissions,
+    get_topic_scopes,
+)
+
+
+#maximum number of topics per bulk edition
+MAX_N_TOPICS = 512
+
+
+SET_POSTS_STATUS_ARGS = {
+    'status': Str(
+        required=True, validate=validate.OneOf(sorted(Post.VALID_STATUSES))),
+}
+
+
+EDIT_TOPICS_ARGS = {
+    'topic_ids': DelimitedList(Int(), required=True,
+        validate=lambda ids: 0 < len(ids) <= MAX_N_TOPICS),
+    'status': Str(validate=validate.OneOf(sorted(Topic.VALID_STATUSES))),
+    'subforum_id': Int(),
+}
+
+
+class UserPostsModerationRes(Resource):
+    @jwt_required
+    def put(self, user_id):
+        '''
+        Sets status of all posts of user.
+        '''
+        user = get_principal()
+        get_user(user_id=user_id)
+        args = parser.parse(SET_POSTS_STATUS_ARGS, request,
+            locations=('form', ))
+        query = Post.query.filter_by(user_id=user_id)
+        #posts only differ by status for permissions on them,
+        #so they are checked once per status
+        statuses = {s for s, in query.with_entities(Post.status).distinct()}
+        statuses = statuses or {args['status']}
+        check_permissions(user, [
+            EditPost(Post(user_id=user_id, status=s), attributes={'status'})
+            for s in statuses
+        ])
+        n_posts = query.filter(Post.status != args['status']).update(
+            {Post.status: args['status']}, synchronize_session=False)
+        db.session.commit()
+        #posts of user may be nested in any topic/user
+        invalidate(GLOBAL_SCOPE)
+        return {
+            'data': {
+                'n_updated': n_posts,
+            },
+        }
+
+
+class TopicsModerationRes(Resource):
+    @jwt_required
+    def put(self):
+        '''
+        Sets status and/or subforum of many topics.
+        '''
+        user = get_principal()
+        args = parser.parse(EDIT_TOPICS_ARGS, request, locations=('form', ))
+        values = {getattr(Topic, k): args[k]
+            for k in ['status', 'subforum_id'] if k in args}
+        if not values:
+            return mk_errors(400, 'status or subforum_id must be set')
+        if 'subforum_id' in args:
+            get_obj(Subforum.query.filter_by(subforum_id=args['subforum_id']),
+                not_found_msg='subforum does not exist')
+        topic_ids = set(args['topic_ids'])
+        topics = Topic.query.filter(Topic.topic_id.in_(topic_ids)).all()
+        if len(topics) != len(topic_ids):
+            return mk_errors(404, 'topics {} do not exist'.format(
+                sorted(topic_ids - {t.topic_id for t in topics})))
+        check_permissions(user, [
+            EditTopic(t, attributes=set(k.key for k in values))
+            for t in topics
+        ])
+        scopes = {s for t in topics
+            for s in get_topic_scopes(t.subforum_id, t.topic_id)}
+        if 'subforum_id' in args:
+            #n_topics of old and new subforums, nested in other topics, change
+            subforums_ids = {t.subforum_id for t in topics}
+            subforums_ids.add(args['subforum_id'])
+            scopes.update(get_topic_scopes(args['subforum_id']))
+            scopes.update(get_subforum_scope(s) for s in subforums_ids)
+        n_topics = Topic.query.filter(Topic.topic_id.in_(topic_ids)).update(
+            values, synchronize_session=False)
+        db.session.commit()
+        invalidate(*scopes)
+        return {
+            'data': {
+                'n_updated': n_topics,
+            },
+        }
@@ -7,7 +7,6 @@ from flask_jwt_extended import (
     create_refresh_token,
     jwt_required,
     jwt_refresh_token_required,
-    get_jwt_identity,
     get_raw_jwt
 )
 from webargs.flaskparser import parser
@@ -31,25 +30,40 @@ from nv.permissions import (
     DeletePost,
 )
 from nv.database import db
+from nv.serializers import (
+    POST_SERIALIZER,
+)
+from nv.principal import get_principal
+from nv.response_cache import (
+    invalidate,
+    get_user_scope,
+)
 from nv.resources.common import (
-    parse_get_coll_args,
+    parse_get_posts_args,
     generic_get_coll,
+    POSTS_LOADING_PROFILE,
     generic_get,
     generic_post,
     generic_put,
     generic_delete,
-    get_user,
     get_obj,
     check_permissions,
+    remove_post_activity,
+    get_post_scopes,
 )
 
 
 class PostsRes(Resource):
+    loading_profile = POSTS_LOADING_PROFILE
+    serializer = POST_SERIALIZER
+
     def get(self):
-        args = parse_get_coll_args(request)
+        args = parse_get_posts_args(request)
         ret = generic_get_coll(
             full_query=Post.query,
             schema=PostSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args,
         )
         return ret
@@ -60,36 +74,41 @@ class PostRes(Resource):
         ret = generic_get(
             obj=Post.query.get(post_id),
             schema=PostSchema(),
+            serializer=POST_SERIALIZER,
         )
         return ret
 
     @jwt_required
     def delete(self, post_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         post = get_obj(Post.query.filter_by(post_id=post_id))
         topic = get_obj(Topic.query.filter_by(topic_id=post.topic_id))
         check_permissions(user, [
             DeletePost(post),
         ])
+        #counters of author change too
+        scopes = get_post_scopes(topic) + [get_user_scope(post.user_id)]
         ret = generic_delete(
             obj=post,
+            on_delete=remove_post_activity,
         )
-        #updating number of posts by user
-        user.n_posts = max(user.n_posts - 1, 0)
-        user.save()
+        invalidate(*scopes)
         return ret
 
     @jwt_required
     def put(self, post_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         post = get_obj(Post.query.filter_by(post_id=post_id))
         topic = get_obj(Topic.query.filter_by(topic_id=post.topic_id))
         check_permissions(user, [
             EditPost(post, attributes=set(request.form)),
         ])
+        #no topic activity update: n_posts and last_post count posts of
+        #every status, so a status change leaves them unchanged
         ret = generic_put(
             obj=post,
             schema=PostSchema(exclude=('user_id', 'topic_id')),
             data=request.form
         )
+        invalidate(*get_post_scopes(topic))
         return ret
@@ -7,7 +7,6 @@ from flask_jwt_extended import (
     create_refresh_token,
     jwt_required,
     jwt_refresh_token_required,
-    get_jwt_identity,
     get_raw_jwt
 )
 from webargs.flaskparser import parser
@@ -34,35 +33,58 @@ from nv.permissions import (
     CreateTopicInSubforum,
 )
 from nv.database import db
+from nv.serializers import (
+    SUBFORUM_SERIALIZER,
+    TOPIC_SERIALIZER,
+)
+from nv.principal import get_principal
+from nv.deletes import delete_subforum
+from nv.response_cache import (
+    cache_response,
+    invalidate,
+    get_user_scope,
+    get_subforum_scope,
+    GLOBAL_SCOPE,
+)
 from nv.resources.common import (
     parse_get_coll_args,
     generic_get_coll,
     parse_get_topics_args,
     get_topics,
+    SUBFORUMS_LOADING_PROFILE,
+    TOPICS_LOADING_PROFILE,
     generic_get,
     generic_post,
     generic_put,
     generic_delete,
-    get_user,
     get_obj,
     check_permissions,
     check_post_time_interval,
+    add_topic_activity,
+    set_last_posted_at,
+    get_topic_scopes,
 )
 
 
 class SubforumsRes(Resource):
+    loading_profile = SUBFORUMS_LOADING_PROFILE
+    serializer = SUBFORUM_SERIALIZER
+
+    @cache_response('subforums')
     def get(self):
         args = parse_get_coll_args(request)
         objs = generic_get_coll(
             full_query=Subforum.query,
             schema=SubforumSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args,
         )
         return objs
 
     @jwt_required
     def post(self):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         check_permissions(user, [
             CreateSubforum(),
         ])
@@ -75,6 +97,7 @@ class SubforumsRes(Resource):
             schema=SubforumSchema(),
             data=data,
         )
+        invalidate('subforums')
         return ret
 
 
@@ -83,24 +106,27 @@ class SubforumRes(Resource):
         ret = generic_get(
             obj=Subforum.query.get(subforum_id),
             schema=SubforumSchema(),
+            serializer=SUBFORUM_SERIALIZER,
         )
         return ret
 
     @jwt_required
     def delete(self, subforum_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         subforum = get_obj(Subforum.query.filter_by(subforum_id=subforum_id))
         check_permissions(user, [
             DeleteSubforum(subforum),
         ])
         ret = generic_delete(
             obj=subforum,
+            delete=delete_subforum,
         )
+        invalidate(GLOBAL_SCOPE)
         return ret
 
     @jwt_required
     def put(self, subforum_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         subforum = get_obj(Subforum.query.filter_by(subforum_id=subforum_id))
         check_permissions(user, [
             EditSubforum(subforum, attributes=set(request.form)),
@@ -110,10 +136,15 @@ class SubforumRes(Resource):
             schema=SubforumSchema(),
             data=request.form
         )
+        invalidate(GLOBAL_SCOPE)
         return ret
 
 
 class SubforumTopicsRes(Resource):
+    loading_profile = TOPICS_LOADING_PROFILE
+    serializer = TOPIC_SERIALIZER
+
+    @cache_response('subforum/{subforum_id}/topics')
     def get(self, subforum_id):
         subforum = Subforum.query.get(subforum_id)
         if subforum is None:
@@ -121,6 +152,8 @@ class SubforumTopicsRes(Resource):
         args = parse_get_topics_args(request)
         ret = get_topics(
             full_query=Topic.query.filter_by(subforum_id=subforum_id),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args
         )
         return ret
@@ -129,7 +162,7 @@ class SubforumTopicsRes(Resource):
     def post(self, subforum_id):
         subforum = get_obj(Subforum.query.filter_by(subforum_id=subforum_id),
             'subforum does not exist')
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         check_permissions(user, [
             CreateTopicInSubforum(subforum),
         ])
@@ -145,8 +178,11 @@ class SubforumTopicsRes(Resource):
         ret = generic_post(
             schema=schema,
             data=data,
+            on_add=add_topic_activity,
+            on_commit=set_last_posted_at,
         )
-        #updating number of topics by user
-        user.n_topics += 1
-        user.save()
+        #n_topics of subforum is nested in topics of other scopes
+        invalidate(*get_topic_scopes(subforum.subforum_id),
+            get_subforum_scope(subforum.subforum_id),
+            get_user_scope(user.user_id))
         return ret
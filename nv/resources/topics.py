@@ -7,7 +7,6 @@ from flask_jwt_extended import (
     create_refresh_token,
     jwt_required,
     jwt_refresh_token_required,
-    get_jwt_identity,
     get_raw_jwt
 )
 from webargs.flaskparser import parser
@@ -35,27 +34,56 @@ from nv.permissions import (
     CreatePostInTopic,
 )
 from nv.database import db
+from nv.serializers import (
+    POST_SERIALIZER,
+    TOPIC_SERIALIZER,
+    TOPIC_REF_SERIALIZER,
+    POST_REF_SERIALIZER,
+)
+from nv.principal import get_principal
+from nv.deletes import delete_topic
+from nv.response_cache import (
+    cache_response,
+    invalidate,
+    get_user_scope,
+    get_subforum_scope,
+)
 from nv.resources.common import (
+    GET_PAGE_ARGS,
+    select_included_users,
+    dump_included_users,
     parse_get_coll_args,
     generic_get_coll,
     parse_get_topics_args,
     get_topics,
+    TOPICS_LOADING_PROFILE,
+    POSTS_LOADING_PROFILE,
     generic_get,
     generic_post,
     generic_put,
     generic_delete,
-    get_user,
     get_obj,
     check_permissions,
     check_post_time_interval,
+    add_post_activity,
+    set_last_posted_at,
+    get_topic_scopes,
+    get_topics_deletion_scopes,
+    get_post_scopes,
 )
 
 
 class TopicsRes(Resource):
+    loading_profile = TOPICS_LOADING_PROFILE
+    serializer = TOPIC_SERIALIZER
+
+    @cache_response('topics')
     def get(self):
         args = parse_get_topics_args(request)
         ret = get_topics(
             full_query=Topic.query,
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args,
         )
         return ret
@@ -66,41 +94,90 @@ class TopicRes(Resource):
         ret = generic_get(
             obj=Topic.query.get(topic_id),
             schema=TopicSchema(),
+            serializer=TOPIC_SERIALIZER,
         )
         return ret
 
     @jwt_required
     def delete(self, topic_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         topic = get_obj(Topic.query.filter_by(topic_id=topic_id))
         check_permissions(user, [
             DeleteTopic(topic),
         ])
+        scopes = get_topics_deletion_scopes(Topic.topic_id == topic.topic_id)
         ret = generic_delete(
             obj=topic,
+            delete=delete_topic,
         )
-        #updating number of topics by user
-        user.n_topics = max(user.n_topics - 1, 0)
-        user.save()
+        invalidate(*scopes)
         return ret
 
     @jwt_required
     def put(self, topic_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         topic = get_obj(
             Topic.query.filter_by(topic_id=topic_id), 'topic not found')
         check_permissions(user, [
             EditTopic(topic, attributes=set(request.form)),
         ])
+        subforum_id = topic.subforum_id
+        scopes = get_topic_scopes(subforum_id, topic.topic_id)
         ret = generic_put(
             obj=topic,
             schema=TopicSchema(),
             data=request.form
         )
+        #topic may have been moved to another subforum, changing n_topics
+        #of both
+        if topic.subforum_id != subforum_id:
+            scopes.extend(get_topic_scopes(topic.subforum_id))
+            scopes.extend([get_subforum_scope(subforum_id),
+                get_subforum_scope(topic.subforum_id)])
+        invalidate(*scopes)
         return ret
 
 
+class TopicPageRes(Resource):
+    '''
+    Topic along with a page of its posts, in which users are referenced by
+    id and included once, with their avatars.
+    '''
+    topic_serializer = TOPIC_REF_SERIALIZER
+    serializer = POST_REF_SERIALIZER
+
+    @cache_response('topic/{topic_id}/posts')
+    def get(self, topic_id):
+        query = self.topic_serializer.apply(
+            Topic.query.filter_by(topic_id=topic_id))
+        topic = query.first()
+        if topic is None:
+            return mk_errors(404, 'topic does not exist')
+        def compound(posts):
+            #users of topic, of its last post and of posts of page
+            user_ids = {p.user_id for p in posts}
+            user_ids.update([topic.user_id, topic.last_post__user_id])
+            users, avatars = select_included_users(user_ids)
+            dump = lambda: {
+                'topic': self.topic_serializer.dump(topic),
+                'included': dump_included_users(users, avatars),
+            }
+            return [tuple(topic)] + users + avatars, dump
+        args = parse_get_coll_args(request, args=GET_PAGE_ARGS)
+        return generic_get_coll(
+            full_query=Post.query.filter_by(topic_id=topic_id),
+            schema=PostSchema(many=True),
+            serializer=self.serializer,
+            compound=compound,
+            **args
+        )
+
+
 class TopicPostsRes(Resource):
+    loading_profile = POSTS_LOADING_PROFILE
+    serializer = POST_SERIALIZER
+
+    @cache_response('topic/{topic_id}/posts')
     def get(self, topic_id):
         topic = get_obj(
             Topic.query.filter_by(topic_id=topic_id), 'topic does not exist')
@@ -108,6 +185,8 @@ class TopicPostsRes(Resource):
         ret = generic_get_coll(
             full_query=Post.query.filter_by(topic_id=topic_id),
             schema=PostSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args
         )
         return ret
@@ -116,7 +195,7 @@ class TopicPostsRes(Resource):
     def post(self, topic_id):
         topic = get_obj(
             Topic.query.filter_by(topic_id=topic_id), 'topic does not exist')
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         check_permissions(user, [
             CreatePostInTopic(topic),
         ])
@@ -132,8 +211,8 @@ class TopicPostsRes(Resource):
         ret = generic_post(
             schema=schema,
             data=data,
+            on_add=add_post_activity,
+            on_commit=set_last_posted_at,
         )
-        #updating number of posts by user
-        user.n_posts += 1
-        user.save()
+        invalidate(*get_post_scopes(topic), get_user_scope(user.user_id))
         return ret
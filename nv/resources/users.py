@@ -4,7 +4,6 @@ from flask_restful import (
 )
 from flask_jwt_extended import (
     jwt_required,
-    get_jwt_identity,
 )
 from nv.models import (
     User,
@@ -20,14 +19,31 @@ from nv.schemas import (
 from nv.util import (
     mk_errors,
 )
+from nv.serializers import (
+    POST_SERIALIZER,
+    TOPIC_SERIALIZER,
+    USER_SERIALIZER,
+)
+from nv.principal import get_principal, invalidate_principal
+from nv.deletes import delete_user
+from nv.response_cache import (
+    invalidate,
+    get_user_scope,
+)
 from nv.resources.common import (
     parse_get_coll_args,
+    parse_get_users_args,
     generic_get_coll,
+    get_users,
+    USERS_LOADING_PROFILE,
+    TOPICS_LOADING_PROFILE,
+    POSTS_LOADING_PROFILE,
     generic_get,
     generic_post,
     generic_put,
     generic_delete,
     get_user,
+    get_user_deletion_scopes,
     check_permissions,
 )
 from nv.permissions import (
@@ -39,11 +55,15 @@ from nv.database import db
 
 
 class UsersRes(Resource):
+    loading_profile = USERS_LOADING_PROFILE
+    serializer = USER_SERIALIZER
+
     def get(self):
-        args = parse_get_coll_args(request)
-        ret = generic_get_coll(
+        args = parse_get_users_args(request)
+        ret = get_users(
             full_query=User.query,
-            schema=UserSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args,
         )
         return ret
@@ -66,24 +86,29 @@ class UserRes(Resource):
         ret = generic_get(
             obj=User.query.get(user_id),
             schema=UserSchema(),
+            serializer=USER_SERIALIZER,
         )
         return ret
 
     @jwt_required
     def delete(self, user_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         target_user = get_user(user_id=user_id)
         check_permissions(user, [
             DeleteUser(target_user),
         ])
+        scopes = get_user_deletion_scopes(target_user.user_id)
         ret = generic_delete(
             obj=target_user,
+            delete=delete_user,
         )
+        invalidate_principal(user_id)
+        invalidate(*scopes)
         return ret
 
     @jwt_required
     def put(self, user_id):
-        user = get_user(username=get_jwt_identity())
+        user = get_principal()
         target_user = get_user(user_id=user_id)
         #EditUser(target=target_user, attributes=set(request.form)).check(user)
         check_permissions(user, [
@@ -94,10 +119,15 @@ class UserRes(Resource):
             schema=UserSchema(),
             data=request.form
         )
+        invalidate_principal(user_id)
+        invalidate(get_user_scope(user_id))
         return ret
 
 
 class UserPostsRes(Resource):
+    loading_profile = POSTS_LOADING_PROFILE
+    serializer = POST_SERIALIZER
+
     def get(self, user_id):
         user = User.query.get(user_id)
         if user is None:
@@ -106,12 +136,17 @@ class UserPostsRes(Resource):
         ret = generic_get_coll(
             full_query=Post.query.filter_by(user_id=user_id),
             schema=PostSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args
         )
         return ret
 
 
 class UserTopicsRes(Resource):
+    loading_profile = TOPICS_LOADING_PROFILE
+    serializer = TOPIC_SERIALIZER
+
     def get(self, user_id):
         user = User.query.get(user_id)
         if user is None:
@@ -120,6 +155,8 @@ class UserTopicsRes(Resource):
         ret = generic_get_coll(
             full_query=Topic.query.filter_by(user_id=user_id),
             schema=TopicSchema(many=True),
+            loading_profile=self.loading_profile,
+            serializer=self.serializer,
             **args
         )
         return ret
@@ -0,0 +1,178 @@
+'''
+Cache of responses of anonymous GET requests.
+
+Each cached response depends on a set of scopes (e.g. 'topics' or
+'topic/<id>/posts') and is stored under a key made of the route, the
+normalized query args and the current versions of its scopes.
+Write handlers invalidate scopes by changing their versions, so that
+stale entries are not reachable anymore and just expire.
+Responses also depend on the scopes of the users and subforums nested in
+them ('user/<id>' and 'subforum/<id>', as their counters change with
+posts/topics created anywhere), which are only known once responses are
+built: they are stored along with responses and checked on cache hits.
+'''
+
+import uuid
+import hashlib
+from functools import wraps
+from flask import request, current_app
+from nv.representations import output_json
+from nv.cache import mk_cache
+from nv.compression import (
+    get_accepted_encoding,
+    is_compressible,
+    compress,
+)
+from nv.conditional import (
+    get_validators,
+    set_validators,
+    get_not_modified_response,
+)
+
+
+#scope all cached responses depend on, for changes that affect many scopes
+#(e.g. users, which are nested in most objects)
+GLOBAL_SCOPE = 'global'
+
+
+def get_user_scope(user_id):
+    return 'user/{}'.format(user_id)
+
+
+def get_subforum_scope(subforum_id):
+    return 'subforum/{}'.format(subforum_id)
+
+
+def init_response_cache(app):
+    spec = app.config['RESPONSE_CACHE']
+    app.extensions['response_cache'] = None if spec == 'none' \
+        else mk_cache(spec)
+
+
+def get_response_cache():
+    return current_app.extensions.get('response_cache')
+
+
+def _get_version_key(scope):
+    return 'response_cache/version/{}'.format(scope)
+
+
+def _mk_version():
+    return uuid.uuid4().hex
+
+
+def get_versions(cache, scopes):
+    keys = [_get_version_key(s) for s in scopes]
+    versions = cache.get_many(*keys)
+    for i, (key, version) in enumerate(zip(keys, versions)):
+        #missing (possibly evicted) versions are replaced by new ones,
+        #so that previous entries cannot be reached
+        if version is None:
+            versions[i] = _mk_version()
+            cache.set(key, versions[i], timeout=0)
+    return versions
+
+
+def invalidate(*scopes):
+    cache = get_response_cache()
+    if cache is None:
+        return
+    for scope in scopes:
+        cache.set(_get_version_key(scope), _mk_version(), timeout=0)
+
+
+def get_normalized_args(args):
+    return '&'.join('{}={}'.format(k, ','.join(args.getlist(k)))
+        for k in sorted(args.keys()))
+
+
+def get_response_key(path, args, versions):
+    key = '{}?{}#{}'.format(path, get_normalized_args(args), ','.join(versions))
+    return 'response_cache/response/{}'.format(
+        hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+
+def get_nested_scopes(data):
+    '''
+    Gets scopes of users and subforums (objects with their ids and
+    counters) in data.
+    '''
+    scopes = set()
+    stack = [data]
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, dict):
+            if 'user_id' in obj and ('n_posts' in obj or 'n_topics' in obj):
+                scopes.add(get_user_scope(obj['user_id']))
+            if 'subforum_id' in obj and 'n_topics' in obj:
+                scopes.add(get_subforum_scope(obj['subforum_id']))
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return sorted(scopes)
+
+
+def _is_fresh(cache, entry):
+    __, __, __, nested_scopes, nested_versions = entry
+    return not nested_scopes \
+        or get_versions(cache, nested_scopes) == nested_versions
+
+
+def _is_cacheable_request():
+    return request.method == 'GET' \
+        and not 'Authorization' in request.headers \
+        and not request.form \
+        and not request.data
+
+
+def cache_response(*scopes):
+    '''
+    Decorator of resources get methods. scopes are formatted with the
+    view args (e.g. 'topic/{topic_id}/posts').
+    '''
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or not _is_cacheable_request():
+                return fn(*args, **kwargs)
+            fmt_scopes = [GLOBAL_SCOPE] + [s.format(**kwargs) for s in scopes]
+            versions = get_versions(cache, fmt_scopes)
+            key = get_response_key(request.path, request.args, versions)
+            entry = cache.get(key)
+            if entry is None or not _is_fresh(cache, entry):
+                ret = fn(*args, **kwargs)
+                #only successful responses are cached
+                if not isinstance(ret, dict):
+                    return ret
+                body = output_json(ret, 200).get_data()
+                nested_scopes = get_nested_scopes(ret)
+                entry = (_mk_version(), body, get_validators(),
+                    nested_scopes, get_versions(cache, nested_scopes))
+                cache.set(key, entry,
+                    timeout=current_app.config['RESPONSE_CACHE_TTL'])
+            else:
+                __, body, validators, __, __ = entry
+                if validators is not None:
+                    set_validators(*validators)
+                    not_modified = get_not_modified_response()
+                    if not_modified is not None:
+                        return not_modified
+            encoding = get_accepted_encoding()
+            if encoding is None or not is_compressible(body):
+                return current_app.response_class(
+                    body, mimetype='application/json')
+            #compressed bodies are cached too, so that they are compressed
+            #once per entry
+            encoded_key = '{}/{}/{}'.format(key, entry[0], encoding)
+            encoded_body = cache.get(encoded_key)
+            if encoded_body is None:
+                encoded_body = compress(body, encoding)
+                cache.set(encoded_key, encoded_body,
+                    timeout=current_app.config['RESPONSE_CACHE_TTL'])
+            resp = current_app.response_class(
+                encoded_body, mimetype='application/json')
+            resp.headers['Content-Encoding'] = encoding
+            return resp
+        return wrapper
+    return decorator
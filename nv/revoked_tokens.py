@@ -0,0 +1,47 @@
+import time
+import threading
+from flask import current_app
+from nv.models import RevokedToken
+
+
+class RevokedTokensStore:
+    '''
+    In-process (per worker) set of revoked tokens ids in front of the
+    revoked_tokens table, so that checking a token needs no query.
+    The set is reloaded from database (unexpired entries only) at most
+    every REVOKED_TOKENS_CACHE_TTL seconds, which bounds the time for
+    tokens revoked by other workers to be seen.
+    '''
+    def __init__(self):
+        self._jtis = set()
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        if self._loaded_at is None:
+            return True
+        ttl = current_app.config['REVOKED_TOKENS_CACHE_TTL']
+        return time.monotonic() - self._loaded_at >= ttl
+
+    def reload(self):
+        with self._lock:
+            self._jtis = RevokedToken.get_unexpired_jtis()
+            self._loaded_at = time.monotonic()
+
+    def is_revoked(self, jti):
+        if self._is_stale():
+            self.reload()
+        return jti in self._jtis
+
+    def revoke(self, jti, expires_at=None):
+        with self._lock:
+            RevokedToken.create_and_save(jti=jti, expires_at=expires_at)
+            self._jtis.add(jti)
+
+    def clear(self):
+        with self._lock:
+            self._jtis = set()
+            self._loaded_at = None
+
+
+revoked_tokens = RevokedTokensStore()
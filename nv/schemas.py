@@ -22,7 +22,6 @@ from marshmallow.fields import (
     DateTime,
     Integer,
 )
-from sqlalchemy import desc
 from nv.database import db
 from nv.models import (
     Avatar,
@@ -31,7 +30,8 @@ from nv.models import (
     Topic,
     Post,
 )
-from nv.util import generate_hash, get_datetime
+from nv.util import generate_hash
+from nv.datetimes import get_datetime, fmt_datetime
 
 
 class LocalizedDateTime(DateTime):
@@ -41,7 +41,7 @@ class LocalizedDateTime(DateTime):
     def _serialize(self, value, attr, obj, **kwargs):
         if value is None:
             return super()._serialize(value, attr, obj, **kwargs)
-        return get_datetime(value).isoformat()
+        return fmt_datetime(value)
 
     def _deserialize(self, value, attr, obj, **kwargs):
         if not value:
@@ -68,12 +68,25 @@ def _split_by_commas(string):
     return tokens
 
 
+class Roles(List):
+    '''
+    List of roles, which may be loaded from a comma-separated string.
+    '''
+    def __init__(self, **kwargs):
+        super().__init__(String(), **kwargs)
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if isinstance(value, str):
+            value = _split_by_commas(value)
+        return super()._deserialize(value, attr, data, **kwargs)
+
+
 class UserSchema(ModelSchema):
     user_id = String(dump_only=True)
     username = field_for(User, 'username', required=True)
     password = field_for(User, 'password', required=True, load_only=True)
     email = Email(required=True, load_only=True)
-    roles = field_for(User, 'roles')
+    roles = Roles()
     status = field_for(User, 'status')
     avatar_id = field_for(User, 'avatar_id', required=True, load_only=True)
     avatar = Nested(
@@ -84,6 +97,9 @@ class UserSchema(ModelSchema):
     created_at = LocalizedDateTime(required=False)
     updated_at = LocalizedDateTime(dump_only=True)
 
+    #columns needed to dump fields that are not columns themselves
+    fields_columns = {'roles': ['roles_mask']}
+
     @validates('password')
     def check_password_len(self, password):
         if len(password) < User.MIN_UNHASHED_PASSWORD_LEN:
@@ -93,7 +109,6 @@ class UserSchema(ModelSchema):
 
     @validates('roles')
     def check_roles(self, roles):
-        roles = _split_by_commas(roles)
         if not roles:
             raise ValidationError('set of roles cannot be empty')
         for role in roles:
@@ -111,18 +126,6 @@ class UserSchema(ModelSchema):
             raise ValidationError(
                 'avatar id={} does not exist'.format(avatar_id))
 
-    @post_load
-    def clean_roles(self, data):
-        if 'roles' in data:
-            roles = set(_split_by_commas(data['roles']))
-            data['roles'] = ','.join(roles)
-        return data
-
-    @post_dump
-    def split_roles_by_commas(self, data):
-        data['roles'] = _split_by_commas(data['roles'])
-        return data
-
     @post_load
     def hash_password(self, data):
         if 'password' in data:
@@ -133,7 +136,13 @@ class UserSchema(ModelSchema):
         unknown = EXCLUDE
         model = User
         sqla_session = db.session
-        exclude = ['posts', 'topics']
+        exclude = [
+            'posts',
+            'topics',
+            'roles_mask',
+            'last_posted_at',
+            'last_topic_created_at',
+        ]
 
 
 class SubforumSchema(ModelSchema):
@@ -146,11 +155,17 @@ class SubforumSchema(ModelSchema):
     created_at = LocalizedDateTime(dump_only=True)
     updated_at = LocalizedDateTime(dump_only=True)
 
-    @post_dump
-    def set_n_topics(self, data):
-        if 'subforum_id' in data:
-            n_topics = \
-                Topic.query.filter_by(subforum_id=data['subforum_id']).count()
+    #numbers of topics may be prefetched for many subforums and passed via
+    #context as a dict indexed by subforum id (see get_subforums_n_topics)
+    @post_dump(pass_original=True)
+    def set_n_topics(self, data, subforum):
+        if 'n_topics' in self.fields:
+            if 'n_topics' in self.context:
+                n_topics = self.context['n_topics'].get(
+                    subforum.subforum_id, 0)
+            else:
+                n_topics = Topic.query.filter_by(
+                    subforum_id=subforum.subforum_id).count()
             data['n_topics'] = n_topics
         return data
 
@@ -172,7 +187,7 @@ class TopicSchema(ModelSchema):
         Topic, 'subforum_id', required=True, load_only=True)
     subforum = Nested(
         SubforumSchema, many=False, dump_only=True)
-    n_posts = Integer(dump_only=True, missing=0)
+    n_posts = Integer(dump_only=True)
     last_post = Nested('PostSchema', many=False, dump_only=True, missing=None)
     created_at = LocalizedDateTime(dump_only=True)
     updated_at = LocalizedDateTime(dump_only=True)
@@ -182,19 +197,22 @@ class TopicSchema(ModelSchema):
         if not status in Topic.VALID_STATUSES:
             raise ValidationError('status \'{}\' is invalid'.format(status))
 
-    @post_dump
-    def set_n_posts(self, data):
-        if 'topic_id' in data:
-            n_posts = Post.query.filter_by(topic_id=data['topic_id']).count()
-            data['n_posts'] = n_posts
-        return data
-
-    @post_dump
-    def set_last_post(self, data):
-        if 'topic_id' in data:
-            query = Post.query.filter_by(topic_id=data['topic_id'])
-            query = query.order_by(desc('created_at'))
-            last_post = query.first()
+    #columns needed by fields that are not model attributes
+    fields_columns = {
+        'last_post': ['last_post_id'],
+    }
+
+    #last posts may be prefetched for a whole page of topics and passed
+    #via context as a dict indexed by topic id (see get_topics_last_posts)
+    @post_dump(pass_original=True)
+    def set_last_post(self, data, topic):
+        if 'last_post' in self.fields:
+            if 'last_posts' in self.context:
+                last_post = self.context['last_posts'].get(topic.last_post_id)
+            elif topic.last_post_id is not None:
+                last_post = Post.query.get(topic.last_post_id)
+            else:
+                last_post = None
             data['last_post'] = PostSchema(exclude=['topic']).dump(last_post)
         return data
 
@@ -202,7 +220,7 @@ class TopicSchema(ModelSchema):
         unknown = EXCLUDE
         model = Topic
         sqla_session = db.session
-        exclude = ['posts']
+        exclude = ['posts', 'last_post_id', 'last_post_at']
 
 
 class PostSchema(ModelSchema):
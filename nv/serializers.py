@@ -0,0 +1,276 @@
+'''
+Compiled serializers for the read path.
+
+They produce the same JSON as the schemas in nv.schemas, but from plain row
+tuples selected in a single query (nested objects are outer joined).
+Nesting is bounded by the excluded keys in NESTED (e.g. topics of last
+posts of topics are not dumped). The dumping function of each serializer
+is generated once, as python source, when it is built.
+'''
+
+from functools import lru_cache
+from sqlalchemy import select, func
+from sqlalchemy.orm import aliased
+from nv.models import (
+    Avatar,
+    User,
+    Subforum,
+    Topic,
+    Post,
+)
+from nv.datetimes import fmt_datetime
+
+
+MODELS = {
+    'avatar': Avatar,
+    'user': User,
+    'subforum': Subforum,
+    'topic': Topic,
+    'post': Post,
+}
+
+
+#dumped columns of each entity, in the form (key, converter).
+#the column is the attribute with the same name as the key, unless
+#overridden in COLUMNS
+FIELDS = {
+    'avatar': [
+        ('avatar_id', '_str'),
+        ('uri', None),
+        ('category', None),
+        ('created_at', '_dt'),
+        ('updated_at', '_dt'),
+    ],
+    'user': [
+        ('user_id', '_str'),
+        ('username', None),
+        ('roles', '_roles'),
+        ('status', None),
+        ('signature', None),
+        ('n_posts', None),
+        ('n_topics', None),
+        ('created_at', '_dt'),
+        ('updated_at', '_dt'),
+    ],
+    'subforum': [
+        ('subforum_id', '_str'),
+        ('title', None),
+        ('description', None),
+        ('position', None),
+        ('created_at', '_dt'),
+        ('updated_at', '_dt'),
+    ],
+    'topic': [
+        ('topic_id', '_str'),
+        ('title', None),
+        ('status', None),
+        ('n_posts', None),
+        ('created_at', '_dt'),
+        ('updated_at', '_dt'),
+    ],
+    'post': [
+        ('post_id', '_str'),
+        ('content', None),
+        ('status', None),
+        ('created_at', '_dt'),
+        ('updated_at', '_dt'),
+    ],
+}
+
+
+#columns of dumped keys that are not columns themselves
+COLUMNS = {
+    'user': {
+        'roles': 'roles_mask',
+    },
+}
+
+
+def _n_topics(subforum):
+    #aliased so that it does not correlate with topics of an outer query
+    topic = aliased(Topic)
+    query = select([func.count(topic.topic_id)])
+    query = query.where(topic.subforum_id == subforum.subforum_id)
+    return query.correlate(subforum).as_scalar()
+
+
+#dumped values computed in SQL, in the form (key, fn(entity) -> expression)
+COMPUTED = {
+    'subforum': [
+        ('n_topics', _n_topics),
+    ],
+}
+
+
+#nested entities, in the form
+#(key, entity, local column, remote column, excluded keys, value if missing)
+NESTED = {
+    'avatar': [],
+    'user': [
+        ('avatar', 'avatar', 'avatar_id', 'avatar_id', (), 'None'),
+    ],
+    'subforum': [],
+    'topic': [
+        ('user', 'user', 'user_id', 'user_id', (), 'None'),
+        ('subforum', 'subforum', 'subforum_id', 'subforum_id', (), 'None'),
+        ('last_post', 'post', 'last_post_id', 'post_id', ('topic', ), '{}'),
+    ],
+    'post': [
+        ('user', 'user', 'user_id', 'user_id', (), 'None'),
+        ('topic', 'topic', 'topic_id', 'topic_id', (), 'None'),
+    ],
+}
+
+
+def _get_roles(roles_mask):
+    return list(User.get_roles_from_mask(roles_mask))
+
+
+_NAMESPACE = {
+    '_str': str,
+    '_dt': fmt_datetime,
+    '_roles': _get_roles,
+}
+
+
+class Serializer:
+    '''
+    Serializer of an entity with its nested objects.
+    Nested objects with paths in references are dumped as their ids only
+    (e.g. 'user_id' instead of 'user' for 'user' or 'last_post.user').
+    If expand is set, only nested objects with paths in it are dumped
+    (e.g. {'topic', 'topic.user'}) and the others are dumped as their ids.
+    '''
+    def __init__(self, entity, exclude=(), references=(), expand=None):
+        self.entity = entity
+        self.model = MODELS[entity]
+        self.references = set(references)
+        self.expand = None if expand is None else get_expand_paths(expand)
+        self.columns = []
+        self.joins = []
+        expr = self._compile(entity, self.model, set(exclude), prefix='')
+        source = 'def dump(row):\n    return {}\n'.format(expr)
+        namespace = dict(_NAMESPACE)
+        exec(source, namespace)
+        self.source = source
+        self.dump = namespace['dump']
+
+    def _add_column(self, expr, label):
+        self.columns.append(expr.label(label))
+        return 'row[{}]'.format(len(self.columns) - 1)
+
+    def _compile(self, entity, model, exclude, prefix):
+        items = []
+        columns = COLUMNS.get(entity, {})
+        for key, conv in FIELDS[entity]:
+            column = getattr(model, columns.get(key, key))
+            value = self._add_column(column, prefix + key)
+            if conv is not None:
+                col = column.property.columns[0]
+                if col.nullable and not col.primary_key:
+                    value = '(None if {0} is None else {1}({0}))'.format(
+                        value, conv)
+                else:
+                    value = '{}({})'.format(conv, value)
+            items.append('{!r}: {}'.format(key, value))
+        for key, fn in COMPUTED.get(entity, []):
+            value = self._add_column(fn(model), prefix + key)
+            items.append('{!r}: {}'.format(key, value))
+        for key, sub_entity, local, remote, sub_exclude, missing \
+                in NESTED[entity]:
+            if key in exclude:
+                continue
+            path = (prefix + key).replace('__', '.')
+            if path in self.references \
+                    or (self.expand is not None
+                        and not path in self.expand):
+                value = self._add_column(
+                    getattr(model, local), prefix + local)
+                items.append('{0!r}: (None if {1} is None else _str({1}))'
+                    .format(local, value))
+                continue
+            sub_model = aliased(MODELS[sub_entity])
+            self.joins.append((sub_model,
+                getattr(sub_model, remote) == getattr(model, local)))
+            sub_prefix = '{}{}__'.format(prefix, key)
+            pk = self._add_column(
+                getattr(sub_model, remote), sub_prefix + '_pk')
+            value = self._compile(
+                sub_entity, sub_model, set(sub_exclude), sub_prefix)
+            items.append('{!r}: ({} if {} is not None else {})'.format(
+                key, value, pk, missing))
+        return '{{{}}}'.format(', '.join(items))
+
+    def apply(self, query, extra_columns=()):
+        '''
+        Gets query of rows to be dumped from a query of the entity model.
+        extra_columns, if any, are selected after the serializer columns.
+        '''
+        for sub_model, onclause in self.joins:
+            query = query.outerjoin(sub_model, onclause)
+        extra_columns = [
+            c.label('_extra_{}'.format(i)) for i, c in enumerate(extra_columns)]
+        return query.with_entities(*self.columns, *extra_columns)
+
+    def dump_all(self, rows):
+        dump = self.dump
+        return [dump(row) for row in rows]
+
+
+def get_nested_paths(entity, exclude=()):
+    '''
+    Gets dotted paths of all objects that may be nested in entity
+    (e.g. 'topic.user.avatar' for posts).
+    '''
+    paths = set()
+    for key, sub_entity, __, __, sub_exclude, __ in NESTED[entity]:
+        if key in exclude:
+            continue
+        paths.add(key)
+        paths.update('{}.{}'.format(key, p)
+            for p in get_nested_paths(sub_entity, sub_exclude))
+    return paths
+
+
+def get_expand_paths(expand):
+    '''
+    Gets paths in expand along with their prefixes, which are implied
+    (e.g. 'topic.user' implies 'topic').
+    '''
+    paths = set()
+    for path in expand:
+        keys = path.split('.')
+        paths.update('.'.join(keys[:i + 1]) for i in range(len(keys)))
+    return frozenset(paths)
+
+
+@lru_cache(maxsize=256)
+def _get_expanded_serializer(entity, expand):
+    return Serializer(entity, expand=expand)
+
+
+def get_expanded_serializer(entity, expand):
+    '''
+    Gets (cached) serializer of entity that only dumps nested objects in
+    expand. Raises ValueError on unknown paths.
+    '''
+    expand = get_expand_paths(expand)
+    invalid = expand - get_nested_paths(entity)
+    if invalid:
+        raise ValueError('invalid expand paths: {}'.format(
+            ', '.join(sorted(invalid))))
+    return _get_expanded_serializer(entity, expand)
+
+
+#built once, at startup
+AVATAR_SERIALIZER = Serializer('avatar')
+USER_SERIALIZER = Serializer('user')
+SUBFORUM_SERIALIZER = Serializer('subforum')
+TOPIC_SERIALIZER = Serializer('topic')
+POST_SERIALIZER = Serializer('post')
+#for compound documents, in which nested users are included separately
+USER_REF_SERIALIZER = Serializer('user', references=('avatar', ))
+TOPIC_REF_SERIALIZER = Serializer(
+    'topic', references=('user', 'last_post.user'))
+POST_REF_SERIALIZER = Serializer(
+    'post', exclude=('topic', ), references=('user', ))
@@ -2,12 +2,17 @@
 
 import argparse
 import getpass
+import datetime as dt
+import sqlalchemy
+from sqlalchemy.schema import CreateColumn, CreateTable
 
 from nv.app import get_app
 from nv.database import db
 from nv.models import (
     User,
     Avatar,
+    Topic,
+    RevokedToken,
 )
 from nv.util import generate_hash
 
@@ -43,6 +48,185 @@ def reset_db(app):
     drop_db_tables(app)
     create_db_tables(app)
 
+def add_missing_columns(app):
+    '''
+    Adds to existing tables the columns declared in models but missing
+    in database. Returns the set of (table name, column name) added.
+    '''
+    added = set()
+    with app.app_context():
+        inspector = sqlalchemy.inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if not table.name in existing_tables:
+                continue
+            existing_cols = {
+                c['name'] for c in inspector.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing_cols:
+                    continue
+                col_ddl = CreateColumn(col).compile(dialect=db.engine.dialect)
+                db.engine.execute('ALTER TABLE {} ADD COLUMN {}'.format(
+                    table.name, col_ddl))
+                added.add((table.name, col.name))
+    return added
+
+def add_missing_indexes(app):
+    '''
+    Creates in existing tables the indexes declared in models but missing
+    in database.
+    '''
+    with app.app_context():
+        inspector = sqlalchemy.inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        for table in db.metadata.sorted_tables:
+            if not table.name in existing_tables:
+                continue
+            existing_idxs = {
+                i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if not index.name in existing_idxs:
+                    index.create(bind=db.engine)
+
+def rebuild_table(conn, table):
+    '''
+    Recreates in SQLite, which cannot alter columns, table as declared in
+    models (e.g. without undeclared columns or with new defaults), keeping
+    its rows. Indexes are then to be added back.
+    '''
+    #referenced tables are needed to compile foreign keys
+    metadata = sqlalchemy.MetaData()
+    for other_table in table.metadata.sorted_tables:
+        other_table.tometadata(metadata)
+    new_table = table.tometadata(metadata, name='{}_new'.format(table.name))
+    conn.execute(CreateTable(new_table))
+    cols = ', '.join(c.name for c in table.columns)
+    conn.execute('INSERT INTO {} ({}) SELECT {} FROM {}'.format(
+        new_table.name, cols, cols, table.name))
+    conn.execute('DROP TABLE {}'.format(table.name))
+    conn.execute('ALTER TABLE {} RENAME TO {}'.format(
+        new_table.name, table.name))
+
+def drop_column(conn, table, column):
+    '''
+    Drops column, no longer declared in table of models, from database.
+    SQLite only supports DROP COLUMN since version 3.35, so there the table
+    is rebuilt without it.
+    '''
+    if conn.dialect.name != 'sqlite':
+        conn.execute('ALTER TABLE {} DROP COLUMN {}'.format(table.name, column))
+        return
+    rebuild_table(conn, table)
+
+def migrate_users_roles(app):
+    '''
+    Moves roles of users from the legacy comma-separated roles column
+    to roles_mask, dropping the former.
+    '''
+    with app.app_context():
+        inspector = sqlalchemy.inspect(db.engine)
+        if not 'users' in inspector.get_table_names():
+            return
+        cols = {c['name'] for c in inspector.get_columns('users')}
+        if not 'roles' in cols:
+            return
+        with db.engine.begin() as conn:
+            conn.execute('UPDATE users SET roles_mask = 0')
+            for role, bit in User.ROLES_BITS.items():
+                conn.execute(
+                    "UPDATE users SET roles_mask = roles_mask + {} "
+                    "WHERE ',' || REPLACE(roles, ' ', '') || ',' "
+                    "LIKE '%,{},%'".format(bit, role))
+            drop_column(conn, User.__table__, 'roles')
+
+def migrate_sqlite_datetimes(app):
+    '''
+    Appends fractions of seconds to datetimes stored by sqlite without them,
+    so that they compare as text with the ones stored with them.
+    Tables whose defaults are still CURRENT_TIMESTAMP (without fractions of
+    seconds) are rebuilt with the current ones.
+    '''
+    with app.app_context():
+        if db.engine.dialect.name != 'sqlite':
+            return
+        inspector = sqlalchemy.inspect(db.engine)
+        existing_tables = set(inspector.get_table_names())
+        with db.engine.begin() as conn:
+            for table in db.metadata.sorted_tables:
+                if not table.name in existing_tables:
+                    continue
+                for col in table.columns:
+                    if not isinstance(col.type, sqlalchemy.DateTime):
+                        continue
+                    conn.execute(
+                        "UPDATE {0} SET {1} = {1} || '.000000' "
+                        "WHERE length({1}) = 19".format(table.name, col.name))
+                ddl = conn.execute(
+                    "SELECT sql FROM sqlite_master "
+                    "WHERE type = 'table' AND name = ?", table.name).scalar()
+                if 'CURRENT_TIMESTAMP' in ddl.upper():
+                    rebuild_table(conn, table)
+
+def migrate_revoked_tokens_expiration(app):
+    '''
+    Sets expiration time of revoked tokens entries created before it was
+    stored, as the longest tokens lifetime counted from now, so that they
+    get pruned.
+    '''
+    with app.app_context():
+        inspector = sqlalchemy.inspect(db.engine)
+        if not 'revoked_tokens' in inspector.get_table_names():
+            return
+        lifetimes = [app.config[k] for k in
+            ['JWT_ACCESS_TOKEN_EXPIRES', 'JWT_REFRESH_TOKEN_EXPIRES']]
+        #tokens never expire if expiration is disabled
+        if not all(isinstance(t, dt.timedelta) for t in lifetimes):
+            return
+        RevokedToken.query.filter(RevokedToken.expires_at.is_(None)).update({
+            RevokedToken.expires_at: dt.datetime.utcnow() + max(lifetimes),
+        }, synchronize_session=False)
+        db.session.commit()
+
+#denormalized activity columns, to be computed for rows that exist when
+#they are added
+TOPIC_ACTIVITY_COLUMNS = {
+    ('topics', 'n_posts'),
+    ('topics', 'last_post_id'),
+    ('topics', 'last_post_at'),
+}
+USER_ACTIVITY_COLUMNS = {
+    ('users', 'last_posted_at'),
+    ('users', 'last_topic_created_at'),
+}
+
+def migrate_db(app):
+    added_columns = add_missing_columns(app)
+    migrate_users_roles(app)
+    migrate_sqlite_datetimes(app)
+    migrate_revoked_tokens_expiration(app)
+    add_missing_indexes(app)
+    create_db_tables(app)
+    if added_columns & TOPIC_ACTIVITY_COLUMNS:
+        repair_topic_activity(app)
+    if added_columns & USER_ACTIVITY_COLUMNS:
+        repair_user_activity(app)
+
+def repair_topic_activity(app):
+    with app.app_context():
+        Topic.refresh_activity()
+        db.session.commit()
+
+def repair_user_activity(app):
+    with app.app_context():
+        User.refresh_activity()
+        db.session.commit()
+
+def prune_revoked_tokens(app):
+    with app.app_context():
+        n_pruned = RevokedToken.prune_expired()
+        db.session.commit()
+    return n_pruned
+
 def create_avatar(app):
     with app.app_context():
         Avatar.create_and_save(
@@ -91,6 +275,41 @@ def main():
         const=True,
         default=False
     )
+    parser.add_argument(
+        '--migrate_db',
+        nargs='?',
+        help='add to existing database the missing tables and columns',
+        const=True,
+        default=False
+    )
+    parser.add_argument(
+        '--create_indexes',
+        nargs='?',
+        help='create in existing database the missing indexes',
+        const=True,
+        default=False
+    )
+    parser.add_argument(
+        '--repair_topic_activity',
+        nargs='?',
+        help='rebuild topics n_posts/last_post_id/last_post_at from posts',
+        const=True,
+        default=False
+    )
+    parser.add_argument(
+        '--repair_user_activity',
+        nargs='?',
+        help='rebuild users last_posted_at/last_topic_created_at',
+        const=True,
+        default=False
+    )
+    parser.add_argument(
+        '--prune_revoked_tokens',
+        nargs='?',
+        help='delete revoked tokens entries of tokens that already expired',
+        const=True,
+        default=False
+    )
     parser.add_argument(
         '--create_su',
         nargs='?',
@@ -124,6 +343,31 @@ def main():
             create_db(app)
             print('done.')
 
+    if args.migrate_db:
+        print('migrating database...', end=' ', flush=True)
+        migrate_db(app)
+        print('done.')
+
+    if args.create_indexes:
+        print('creating indexes...', end=' ', flush=True)
+        add_missing_indexes(app)
+        print('done.')
+
+    if args.repair_topic_activity:
+        print('repairing topics activity...', end=' ', flush=True)
+        repair_topic_activity(app)
+        print('done.')
+
+    if args.repair_user_activity:
+        print('repairing users activity...', end=' ', flush=True)
+        repair_user_activity(app)
+        print('done.')
+
+    if args.prune_revoked_tokens:
+        print('pruning revoked tokens...', end=' ', flush=True)
+        n_pruned = prune_revoked_tokens(app)
+        print('done ({} pruned).'.format(n_pruned))
+
     if args.create_su:
         create_su(app, args.su_passwd)
         print('superuser "su" created.')
@@ -1,10 +1,5 @@
-from flask import (
-    make_response,
-    jsonify,
-)
 from passlib.hash import pbkdf2_sha256 as sha256
-import datetime as dt
-import arrow
+from nv.representations import output_json
 
 
 def envelope(fn, key='data'):
@@ -74,7 +69,7 @@ def mk_errors(code, messages_or_errors, as_response=True):
     messages_or_errors = to_list(messages_or_errors)
     errors = [mk_message(me) for me in messages_or_errors]
     if as_response:
-        return make_response(jsonify({'errors': errors}), code)
+        return output_json({'errors': errors}, code)
     else:
         return {'errors': errors}, code
 
@@ -85,25 +80,3 @@ def fmt_validation_error_messages(messages):
             [["{}: {}".format(k, v) for v in to_list(vs)]\
                 for k, vs in messages.items()])
     return [str(m) for m in to_list(messages)]
-
-
-def get_local_tz():
-    return dt.datetime.now(dt.timezone.utc).astimezone().tzinfo
-
-
-def get_utc_tz():
-    return dt.timezone.utc
-
-
-def get_datetime(datetime):
-    '''
-    datetime may be either datetime object or ISO-formatted datetime string.
-    if it doesn't contain tzinfo, assumes it's UTC.
-    '''
-    datetime = arrow.get(datetime).datetime
-    datetime = datetime.astimezone(get_utc_tz())
-    return datetime
-
-
-def get_now():
-    return get_datetime(dt.datetime.now(get_utc_tz()))
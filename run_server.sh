@@ -11,8 +11,10 @@ export FLASK_ENV=$app_env
 if [[ "$app_env" == 'development' ]]; then
     flask run --host=$host --with-threads --port=$port $@
 else
+	#NEWVALLEY_WORKER_ID must be set (see nv/ids.py)
 	mkdir -p ./log
     gunicorn -w $n_workers -b "$host:$port" 'nv.app:get_app()' \
+		-c gunicorn_conf.py \
 		--access-logfile ./log/access.log \
 		--error-logfile ./log/error.log \
 		--log-level debug $@
@@ -1,4 +1,5 @@
 import pytest
+from sqlalchemy import event
 from flask_jwt_extended import create_access_token, create_refresh_token
 from nv.app import get_app
 from nv import metaconfig
@@ -109,6 +110,10 @@ def app():
             user_id=user_2.user_id,
             topic_id=topic.topic_id,
         )
+        #posts above were not created via endpoints
+        Topic.refresh_activity()
+        User.refresh_activity()
+        db.session.commit()
     yield app
     #teardown
     with app.app_context():
@@ -125,6 +130,21 @@ def decorate_crud(fn, token):
     return wrapper
 
 
+@pytest.fixture()
+def sql_statements(app):
+    '''
+    List of SQL statements executed while the fixture is active.
+    '''
+    statements = []
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    yield statements
+    event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
 @pytest.fixture()
 def client(app):
     with app.test_client() as c:
@@ -163,7 +183,8 @@ def _topic_id_getter(app):
     def wrapper(username='user'):
         with app.app_context():
             user_id = User.query.filter_by(username=username).first().user_id
-            topic_id = Topic.query.filter_by(user_id=user_id).first().topic_id
+            topic_id = Topic.query.filter_by(user_id=user_id).filter(
+                Topic.status != 'unpublished').first().topic_id
         return topic_id
     return wrapper
 
@@ -177,7 +198,8 @@ def _post_id_getter(app):
     def wrapper(username='user'):
         with app.app_context():
             user_id = User.query.filter_by(username=username).first().user_id
-            post_id = Post.query.filter_by(user_id=user_id).first().post_id
+            post_id = Post.query.filter_by(
+                user_id=user_id, status='published').first().post_id
         return post_id
     return wrapper
 
@@ -246,7 +268,10 @@ def _client_with_tok_getter(app, **app_config):
     def wrapper(username='user'):
         with app.test_client() as c:
             with app.app_context():
-                token = create_access_token(identity=username)
+                #tokens carry the same claims as the ones from login
+                user = User.query.filter_by(username=username).first()
+                token = create_access_token(
+                    identity=username if user is None else user)
                 c.get = decorate_crud(c.get, token)
                 c.post = decorate_crud(c.post, token)
                 c.delete = decorate_crud(c.delete, token)
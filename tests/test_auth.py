@@ -1,3 +1,9 @@
+import datetime as dt
+from flask_jwt_extended import decode_token
+from nv.models import User, RevokedToken
+from nv.database import db
+
+
 def test_unregistered_user_cannot_login_with_username(client):
     resp = client.post('/api/auth/login',
         data={'username': 'unregistered', 'password': 'testpass'})
@@ -96,3 +102,42 @@ def test_logged_in_user_can_use_new_token(client, refresh_token):
     )
     assert resp_1.status_code == 200
     assert resp_2.status_code == 200
+
+
+def test_revocation_check_does_not_query_database(
+        client_with_tok, sql_statements):
+    resp_1 = client_with_tok.get('/api/auth/ok')
+    del sql_statements[:]
+    resp_2 = client_with_tok.get('/api/auth/ok')
+    assert resp_2.status_code == 200
+    assert not [s for s in sql_statements if 'revoked_tokens' in s]
+
+
+def test_expired_revoked_tokens_are_pruned(app):
+    with app.app_context():
+        now = dt.datetime.utcnow()
+        RevokedToken.create_and_save(
+            jti='expired', expires_at=now - dt.timedelta(seconds=1))
+        RevokedToken.create_and_save(
+            jti='unexpired', expires_at=now + dt.timedelta(hours=1))
+        n_pruned = RevokedToken.prune_expired()
+        db.session.commit()
+        jtis = {t.jti for t in RevokedToken.query.all()}
+    assert n_pruned == 1
+    assert 'expired' not in jtis
+    assert 'unexpired' in jtis
+
+
+def test_access_token_carries_user_claims(app, client):
+    resp = client.post('/api/auth/login',
+        data={
+            'username': 'user',
+            'password': 'testpass'
+        }
+    )
+    with app.app_context():
+        claims = decode_token(resp.json['access_token'])['user_claims']
+        user = User.query.filter_by(username='user').first()
+        assert claims == {
+            'user_id': user.user_id,
+        }
@@ -42,6 +42,13 @@ def test_client_limits_avatars(client):
     assert len(resp_2.json['data']) <= 2
 
 
+def test_client_cannot_expand_avatars(client):
+    resp_1 = client.get('/api/avatars?expand=anything')
+    resp_2 = client.get('/api/avatars?expand=')
+    assert resp_1.status_code == 400
+    assert resp_2.status_code == 200
+
+
 def test_logged_off_client_cannot_create_avatar(client):
     resp = client.post('/api/avatars',
         data={
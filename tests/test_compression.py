@@ -0,0 +1,68 @@
+import gzip
+import json
+import zlib
+from nv.compression import compress_chunks
+
+
+def _gzip_get(client, url, **kwargs):
+    return client.get(url, headers={'Accept-Encoding': 'gzip'}, **kwargs)
+
+
+def test_large_collection_is_compressed(client):
+    resp_1 = client.get('/api/topics')
+    resp_2 = _gzip_get(client, '/api/topics')
+    assert resp_2.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in resp_2.headers['Vary']
+    assert len(resp_2.data) < len(resp_1.data)
+    assert json.loads(gzip.decompress(resp_2.data)) == resp_1.json
+
+
+def test_not_compressed_without_accept_encoding(client):
+    resp = client.get('/api/topics')
+    assert not 'Content-Encoding' in resp.headers
+    assert 'Accept-Encoding' in resp.headers['Vary']
+
+
+def test_small_response_is_not_compressed(app, client):
+    app.config['COMPRESSION_MIN_SIZE'] = 10**6
+    resp = _gzip_get(client, '/api/topics')
+    assert not 'Content-Encoding' in resp.headers
+    assert resp.json['data']
+
+
+def test_compression_can_be_disabled(app, client):
+    app.config['COMPRESSION'] = False
+    resp = _gzip_get(client, '/api/topics')
+    assert not 'Content-Encoding' in resp.headers
+
+
+def test_compressed_response_is_cached(client, sql_statements):
+    resp_1 = _gzip_get(client, '/api/topics')
+    del sql_statements[:]
+    resp_2 = _gzip_get(client, '/api/topics')
+    assert resp_2.headers['Content-Encoding'] == 'gzip'
+    assert resp_2.data == resp_1.data
+    assert not sql_statements
+
+
+def test_compressed_response_has_own_etag(client):
+    resp_1 = client.get('/api/topics')
+    resp_2 = _gzip_get(client, '/api/topics')
+    assert resp_2.headers['ETag'] != resp_1.headers['ETag']
+    resp_3 = client.get('/api/topics', headers={
+        'Accept-Encoding': 'gzip',
+        'If-None-Match': resp_2.headers['ETag'],
+    })
+    assert resp_3.status_code == 304
+    assert resp_3.headers['ETag'] == resp_2.headers['ETag']
+
+
+def test_compress_chunks(app):
+    chunks = ['{"data": [', '1, 2', ', 3]}']
+    with app.app_context():
+        compressed = list(compress_chunks(chunks, 'gzip'))
+    #each chunk can be decoded as soon as it is received
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk, compressed_chunk in zip(chunks, compressed):
+        assert decompressor.decompress(compressed_chunk) == chunk.encode()
+    assert gzip.decompress(b''.join(compressed)) == ''.join(chunks).encode()
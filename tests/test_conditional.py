@@ -0,0 +1,94 @@
+def test_collection_has_validators(client):
+    resp = client.get('/api/topics')
+    assert resp.status_code == 200
+    assert resp.headers['ETag']
+    assert resp.headers['Last-Modified']
+
+
+def test_collection_not_modified(client):
+    resp_1 = client.get('/api/topics?order=newest')
+    resp_2 = client.get('/api/topics?order=newest',
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+    assert not resp_2.data
+    assert resp_2.headers['ETag'] == resp_1.headers['ETag']
+
+
+def test_collection_not_modified_from_response_cache(client, sql_statements):
+    resp_1 = client.get('/api/subforums')
+    del sql_statements[:]
+    resp_2 = client.get('/api/subforums',
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+    assert not sql_statements
+
+
+def test_collection_etag_depends_on_args(client):
+    resp_1 = client.get('/api/topics?max_n_results=1')
+    resp_2 = client.get('/api/topics?max_n_results=2')
+    assert resp_1.headers['ETag'] != resp_2.headers['ETag']
+
+
+def test_collection_etag_changes_with_new_post(
+        client, client_with_tok, topic_id):
+    url = '/api/topics/{}/posts'.format(topic_id)
+    resp_1 = client.get(url)
+    client_with_tok.post(url, data={'content': 'new post'})
+    resp_2 = client.get(url,
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 200
+    assert resp_2.headers['ETag'] != resp_1.headers['ETag']
+
+
+def test_item_not_modified(client, topic_id):
+    url = '/api/topics/{}'.format(topic_id)
+    resp_1 = client.get(url)
+    resp_2 = client.get(url,
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+    assert not resp_2.data
+
+
+def test_item_etag_changes_with_nested_user_edit(
+        client, client_with_tok, topic_id, user_id):
+    url = '/api/topics/{}'.format(topic_id)
+    resp_1 = client.get(url)
+    client_with_tok.put('/api/users/{}'.format(user_id),
+        data={'signature': 'new signature'})
+    resp_2 = client.get(url,
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 200
+    assert resp_2.json['data']['user']['signature'] == 'new signature'
+
+
+def test_item_not_modified_is_not_serialized(
+        client, topic_id, monkeypatch):
+    from nv.serializers import TOPIC_SERIALIZER
+    url = '/api/topics/{}'.format(topic_id)
+    resp_1 = client.get(url)
+    def dump(row):
+        raise AssertionError('row serialized')
+    monkeypatch.setattr(TOPIC_SERIALIZER, 'dump', dump)
+    resp_2 = client.get(url,
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+
+
+def test_collection_not_modified_with_weak_etag(client):
+    resp_1 = client.get('/api/topics')
+    resp_2 = client.get('/api/topics',
+        headers={'If-None-Match': 'W/' + resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+
+
+def test_projected_collection_not_modified_is_not_serialized(
+        client, monkeypatch):
+    from nv.schemas import AvatarSchema
+    url = '/api/avatars?fields=avatar_id,uri'
+    resp_1 = client.get(url)
+    def dump(self, objs, *args, **kwargs):
+        raise AssertionError('objects serialized')
+    monkeypatch.setattr(AvatarSchema, 'dump', dump)
+    resp_2 = client.get(url,
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
@@ -0,0 +1,59 @@
+import pytest
+import datetime as dt
+from nv.datetimes import get_datetime, fmt_datetime
+
+
+def test_naive_datetime_is_assumed_utc():
+    datetime = get_datetime(dt.datetime(2018, 11, 20, 10, 30))
+    assert datetime == dt.datetime(2018, 11, 20, 10, 30, tzinfo=dt.timezone.utc)
+    assert datetime.tzinfo is dt.timezone.utc
+
+
+def test_aware_datetime_is_converted_to_utc():
+    tz = dt.timezone(dt.timedelta(hours=-3))
+    datetime = get_datetime(dt.datetime(2018, 11, 20, 7, 30, tzinfo=tz))
+    assert datetime == dt.datetime(2018, 11, 20, 10, 30, tzinfo=dt.timezone.utc)
+    assert datetime.utcoffset() == dt.timedelta(0)
+
+
+def test_iso_strings_are_parsed():
+    expected = dt.datetime(2018, 11, 20, 10, 30, 1, tzinfo=dt.timezone.utc)
+    assert get_datetime('2018-11-20T10:30:01Z') == expected
+    assert get_datetime('2018-11-20T07:30:01-03:00') == expected
+    assert get_datetime('2018-11-20 10:30:01') == expected
+
+
+def test_iso_strings_with_fractional_seconds_are_parsed():
+    expected = dt.datetime(
+        2018, 11, 20, 10, 30, 1, 500000, tzinfo=dt.timezone.utc)
+    assert get_datetime('2018-11-20T10:30:01.5Z') == expected
+    assert get_datetime('2018-11-20T10:30:01.500000z') == expected
+    assert get_datetime('2018-11-20T07:30:01.5-03:00') == expected
+
+
+def test_iso_strings_in_basic_format_are_parsed():
+    expected = dt.datetime(2018, 11, 20, 10, 30, 1, tzinfo=dt.timezone.utc)
+    assert get_datetime('20181120T103001Z') == expected
+    assert get_datetime('20181120T073001-0300') == expected
+
+
+def test_iso_week_dates_are_parsed():
+    expected = dt.datetime(2018, 11, 20, tzinfo=dt.timezone.utc)
+    assert get_datetime('2018-W47-2') == expected
+    assert get_datetime('2018W472') == expected
+    assert get_datetime('2018-W47-2T10:30:01Z') \
+        == expected.replace(hour=10, minute=30, second=1)
+
+
+def test_invalid_iso_strings_are_not_parsed():
+    for string in ['', 'olar', '2018-13-01', '2018-11-20T25:00:00']:
+        with pytest.raises(ValueError):
+            get_datetime(string)
+
+
+def test_fmt_datetime_of_naive_and_aware_datetimes_match():
+    naive = dt.datetime(2018, 11, 20, 10, 30, 1, 123)
+    aware = naive.replace(tzinfo=dt.timezone.utc)
+    assert fmt_datetime(naive) == '2018-11-20T10:30:01.000123+00:00'
+    assert fmt_datetime(naive) == fmt_datetime(aware)
+    assert fmt_datetime(naive) == aware.isoformat()
@@ -0,0 +1,109 @@
+import datetime as dt
+import pytest
+import gunicorn_conf
+from nv.ids import (
+    IdGenerator,
+    get_default_worker_id,
+    get_id_datetime,
+    get_id_ms,
+    MAX_WORKER_ID,
+)
+
+
+def test_ids_are_increasing_and_unique():
+    gen = IdGenerator(worker_id=3)
+    ids = [gen.next_id() for __ in range(10000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(0 < i < 2**63 for i in ids)
+
+
+def test_ids_of_workers_differ():
+    clock = lambda: 1600000000.0
+    gen_1 = IdGenerator(worker_id=1, clock=clock)
+    gen_2 = IdGenerator(worker_id=MAX_WORKER_ID, clock=clock)
+    ids_1 = {gen_1.next_id() for __ in range(100)}
+    ids_2 = {gen_2.next_id() for __ in range(100)}
+    assert not ids_1 & ids_2
+
+
+def test_ids_keep_increasing_when_clock_goes_backwards():
+    times = [1600000000.0, 1599999999.0, 1599999999.0]
+    gen = IdGenerator(worker_id=0, clock=lambda: times.pop(0))
+    ids = [gen.next_id() for __ in range(3)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 3
+
+
+def test_ids_keep_increasing_when_sequence_is_exhausted():
+    gen = IdGenerator(worker_id=0, clock=lambda: 1600000000.0)
+    ids = [gen.next_id() for __ in range(2**12 + 1)]
+    assert ids == sorted(ids)
+    assert get_id_ms(ids[-1]) == get_id_ms(ids[0]) + 1
+
+
+def test_ids_sort_by_creation_time():
+    gen = IdGenerator(worker_id=0)
+    now = dt.datetime.utcnow()
+    created_at = get_id_datetime(gen.next_id())
+    assert abs((created_at - now).total_seconds()) < 1
+
+
+def test_new_objects_ids_sort_by_creation(client_with_tok, topic_id):
+    url = '/api/topics/{}/posts'.format(topic_id)
+    resp_1 = client_with_tok.post(url, data={'content': 'first'})
+    resp_2 = client_with_tok.post(url, data={'content': 'second'})
+    assert int(resp_1.json['data']['post_id']) \
+        < int(resp_2.json['data']['post_id'])
+
+
+def test_worker_id_is_offset_by_slot(monkeypatch):
+    monkeypatch.setenv('NEWVALLEY_WORKER_ID', '8')
+    assert get_default_worker_id() == 8
+    assert get_default_worker_id(slot=3) == 11
+    monkeypatch.setenv('NEWVALLEY_WORKER_ID', str(MAX_WORKER_ID))
+    with pytest.raises(ValueError):
+        get_default_worker_id(slot=1)
+
+
+class DummyWorker:
+    pass
+
+
+class DummyConfig:
+    workers = 4
+
+
+class DummyServer:
+    def __init__(self):
+        self.WORKERS = {}
+        self.cfg = DummyConfig()
+
+    def spawn(self, pid):
+        worker = DummyWorker()
+        gunicorn_conf.pre_fork(self, worker)
+        self.WORKERS[pid] = worker
+        return worker.nv_slot
+
+
+def test_gunicorn_workers_get_distinct_slots_reused_after_exit():
+    server = DummyServer()
+    assert [server.spawn(pid) for pid in [10, 11, 12]] == [0, 1, 2]
+    del server.WORKERS[11]
+    assert server.spawn(13) == 1
+    assert server.spawn(14) == 3
+
+
+def test_worker_id_is_required_in_production(monkeypatch):
+    monkeypatch.delenv('NEWVALLEY_WORKER_ID', raising=False)
+    assert get_default_worker_id(slot=1) != get_default_worker_id(slot=2)
+    with pytest.raises(ValueError):
+        get_default_worker_id(required=True)
+    server = DummyServer()
+    with pytest.raises(ValueError):
+        gunicorn_conf.on_starting(server)
+    monkeypatch.setenv('NEWVALLEY_WORKER_ID', str(MAX_WORKER_ID - 1))
+    with pytest.raises(ValueError):
+        gunicorn_conf.on_starting(server)
+    monkeypatch.setenv('NEWVALLEY_WORKER_ID', '0')
+    gunicorn_conf.on_starting(server)
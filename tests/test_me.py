@@ -30,3 +30,20 @@ def test_client_gets_correct_user_fields_for_itself(client_with_tok):
         'n_topics',
         'email',
     } == set(resp.json['data'].keys())
+
+
+def test_client_gets_itself_not_modified(client_with_tok):
+    resp_1 = client_with_tok.get('/api/me')
+    resp_2 = client_with_tok.get('/api/me',
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+
+
+def test_email_change_changes_etag_of_itself(client_with_tok, user_id):
+    resp_1 = client_with_tok.get('/api/me')
+    client_with_tok.put('/api/users/{}'.format(user_id),
+        data={'email': 'new@users.com'})
+    resp_2 = client_with_tok.get('/api/me',
+        headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 200
+    assert resp_2.json['data']['email'] == 'new@users.com'
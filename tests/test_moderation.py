@@ -0,0 +1,84 @@
+def test_mod_unpublishes_all_posts_of_user(
+        mod_with_tok, client_with_tok, client, topic_id, user_id):
+    for i in range(3):
+        client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'spam {}'.format(i)})
+    resp_1 = client.get('/api/users/{}/posts'.format(user_id))
+    resp_2 = mod_with_tok.put('/api/moderation/users/{}/posts'.format(user_id),
+        data={'status': 'unpublished'})
+    resp_3 = client.get('/api/users/{}/posts'.format(user_id))
+    assert resp_2.status_code == 200
+    assert resp_2.json['data']['n_updated'] == len(
+        [p for p in resp_1.json['data'] if p['status'] == 'published'])
+    assert {p['status'] for p in resp_3.json['data']} == {'unpublished'}
+
+
+def test_mod_unpublishes_posts_in_single_transaction(
+        mod_with_tok, client_with_tok, topic_id, user_id, sql_statements):
+    for i in range(3):
+        client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'spam {}'.format(i)})
+    del sql_statements[:]
+    mod_with_tok.put('/api/moderation/users/{}/posts'.format(user_id),
+        data={'status': 'unpublished'})
+    assert len([s for s in sql_statements if s.startswith('UPDATE')]) == 1
+
+
+def test_user_cannot_unpublish_posts_of_other_user(
+        client_with_tok, user_id_getter):
+    resp = client_with_tok.put(
+        '/api/moderation/users/{}/posts'.format(user_id_getter('user_b')),
+        data={'status': 'unpublished'})
+    assert resp.status_code == 401
+
+
+def test_mod_cannot_set_invalid_posts_status(mod_with_tok, user_id):
+    resp = mod_with_tok.put('/api/moderation/users/{}/posts'.format(user_id),
+        data={'status': 'invalid'})
+    assert resp.status_code == 422
+
+
+def test_mod_edits_many_topics(mod_with_tok, client, app):
+    from nv.models import Subforum, Topic
+    with app.app_context():
+        subforum_ids = [s.subforum_id for s in Subforum.query]
+        topic_ids = [t.topic_id for t in Topic.query.filter_by(
+            subforum_id=subforum_ids[0])]
+    url = '/api/subforums/{}/topics'.format(subforum_ids[1])
+    resp_1 = client.get(url)
+    resp_2 = mod_with_tok.put('/api/moderation/topics', data={
+        'topic_ids': ','.join(str(t) for t in topic_ids),
+        'status': 'locked',
+        'subforum_id': subforum_ids[1],
+    })
+    resp_3 = client.get(url)
+    assert resp_2.status_code == 200
+    assert resp_2.json['data']['n_updated'] == len(topic_ids)
+    moved = [t for t in resp_3.json['data']
+        if int(t['topic_id']) in topic_ids]
+    assert len(resp_3.json['data']) == len(resp_1.json['data']) + len(topic_ids)
+    assert {t['status'] for t in moved} == {'locked'}
+
+
+def test_user_cannot_edit_topics_of_other_users(
+        client_with_tok, topic_id_getter):
+    resp = client_with_tok.put('/api/moderation/topics', data={
+        'topic_ids': str(topic_id_getter('user_b')),
+        'status': 'locked',
+    })
+    assert resp.status_code == 401
+
+
+def test_editing_missing_topics_fails(mod_with_tok, topic_id):
+    resp = mod_with_tok.put('/api/moderation/topics', data={
+        'topic_ids': '{},1'.format(topic_id),
+        'status': 'locked',
+    })
+    assert resp.status_code == 404
+
+
+def test_editing_topics_requires_values(mod_with_tok, topic_id):
+    resp = mod_with_tok.put('/api/moderation/topics', data={
+        'topic_ids': str(topic_id),
+    })
+    assert resp.status_code == 400
@@ -1,3 +1,10 @@
+import datetime as dt
+from sqlalchemy import event
+from nv.database import db
+from nv.models import Post
+from nv.resources.common import encode_cursor
+
+
 def test_client_can_get_posts(client):
     resp = client.get('/api/posts')
     assert resp.status_code == 200
@@ -39,6 +46,85 @@ def test_client_offsets_posts(client):
         == len(resp_2.json['data']) + min(2, len(resp_1.json['data']))
 
 
+def test_client_pages_posts_with_cursor(client):
+    resp = client.get('/api/posts?order=oldest')
+    post_ids = []
+    cursor = ''
+    for __ in range(len(resp.json['data'])):
+        resp_2 = client.get(
+            '/api/posts?order=oldest&max_n_results=1{}'.format(cursor))
+        assert resp_2.status_code == 200
+        post_ids.extend(p['post_id'] for p in resp_2.json['data'])
+        if resp_2.json['next_cursor'] is None:
+            break
+        cursor = '&cursor={}'.format(resp_2.json['next_cursor'])
+    assert post_ids == [p['post_id'] for p in resp.json['data']]
+
+
+def test_client_pages_posts_of_same_second_with_cursor(
+        app, client, topic_id, user_id):
+    #ids in reverse order of creation times, which differ by microseconds
+    created_at = dt.datetime(2030, 1, 1, 10, 30, 1)
+    with app.app_context():
+        for i in range(3):
+            Post.create_and_save(
+                post_id=10 - i,
+                content='post {}'.format(i),
+                user_id=user_id,
+                topic_id=topic_id,
+                created_at=created_at + dt.timedelta(microseconds=i),
+            )
+    posts = []
+    cursor = ''
+    for __ in range(3):
+        resp = client.get(
+            '/api/posts?order=newest&max_n_results=1{}'.format(cursor))
+        posts.extend(resp.json['data'])
+        cursor = '&cursor={}'.format(resp.json['next_cursor'])
+    assert [p['post_id'] for p in posts] == ['8', '9', '10']
+    assert posts[0]['created_at'] == '2030-01-01T10:30:01.000002+00:00'
+
+
+def test_client_cannot_use_cursor_from_other_order(client):
+    resp_1 = client.get('/api/posts?order=oldest&max_n_results=1')
+    resp_2 = client.get('/api/posts?order=newest&cursor={}'.format(
+        resp_1.json['next_cursor']))
+    resp_3 = client.get('/api/posts?cursor=invalid')
+    assert resp_2.status_code == 400
+    assert resp_3.status_code == 400
+
+
+def test_client_cannot_use_cursor_with_malformed_values(client):
+    cursors = [
+        encode_cursor('newest', [[1], [2]]),
+        encode_cursor('newest', ['x', 1]),
+        encode_cursor('newest', ['x']),
+        encode_cursor('newest', []),
+        encode_cursor('newest', [{'dt': 1}, 1]),
+        encode_cursor('newest', [dt.datetime(2020, 1, 1), 'x']),
+        encode_cursor('newest', [dt.datetime(2020, 1, 1), 1, 2]),
+    ]
+    for cursor in cursors:
+        resp = client.get('/api/posts?order=newest&cursor={}'.format(cursor))
+        assert resp.status_code == 400
+        assert 'SQL' not in resp.get_data(as_text=True)
+
+
+def test_client_gets_posts_without_total(client):
+    resp_1 = client.get('/api/posts')
+    resp_2 = client.get('/api/posts?with_total=false')
+    assert resp_2.json['total'] is None
+    assert resp_2.json['data'] == resp_1.json['data']
+
+
+def test_client_gets_posts_with_cached_total(client):
+    resp_1 = client.get('/api/posts')
+    resp_2 = client.get('/api/posts?total_mode=cached')
+    resp_3 = client.get('/api/posts?total_mode=cached')
+    assert resp_2.json['total'] == resp_1.json['total']
+    assert resp_3.json['total'] == resp_1.json['total']
+
+
 def test_client_limits_posts(client):
     resp_1 = client.get('/api/posts?max_n_results=1')
     resp_2 = client.get('/api/posts?max_n_results=2')
@@ -194,3 +280,98 @@ def test_logged_in_client_corretly_edits_its_post(
     assert resp_3.status_code == 200
     assert resp_3.json['data']['content'] \
         == resp_1.json['data']['content'] + '_altered'
+
+
+def test_deleting_post_decrements_n_posts_of_its_author(
+        client_with_tok, mod_with_tok, topic_id, user_id_getter):
+    user_id = user_id_getter('user')
+    mod_id = user_id_getter('mod')
+    resp_1 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'to be deleted'})
+    resp_2 = client_with_tok.get('/api/users/{}'.format(user_id))
+    resp_3 = mod_with_tok.get('/api/users/{}'.format(mod_id))
+    resp_4 = mod_with_tok.delete(
+        '/api/posts/{}'.format(resp_1.json['data']['post_id']))
+    resp_5 = client_with_tok.get('/api/users/{}'.format(user_id))
+    resp_6 = mod_with_tok.get('/api/users/{}'.format(mod_id))
+    assert resp_4.status_code == 204
+    assert resp_5.json['data']['n_posts'] == resp_2.json['data']['n_posts'] - 1
+    assert resp_6.json['data']['n_posts'] == resp_3.json['data']['n_posts']
+
+
+def test_post_status_change_keeps_topic_activity(
+        client_with_tok, mod_with_tok, topic_id):
+    resp_1 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'to be unpublished'})
+    post_id = resp_1.json['data']['post_id']
+    resp_2 = client_with_tok.get('/api/topics/{}'.format(topic_id))
+    resp_3 = mod_with_tok.put('/api/posts/{}'.format(post_id),
+        data={'status': 'unpublished'})
+    resp_4 = client_with_tok.get('/api/topics/{}'.format(topic_id))
+    assert resp_3.status_code == 200
+    assert resp_3.json['data']['status'] == 'unpublished'
+    assert resp_2.json['data']['last_post']['post_id'] == post_id
+    assert resp_4.json['data']['n_posts'] == resp_2.json['data']['n_posts']
+    assert resp_4.json['data']['last_post']['post_id'] == post_id
+
+
+def test_creating_post_commits_once(client_with_tok, topic_id, app):
+    commits = []
+    with app.app_context():
+        engine = db.engine
+    listener = lambda conn: commits.append(conn)
+    event.listen(engine, 'commit', listener)
+    try:
+        resp = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'single transaction'})
+    finally:
+        event.remove(engine, 'commit', listener)
+    assert resp.status_code == 200
+    assert len(commits) == 1
+
+
+def test_client_multi_gets_posts(client, post_id_getter):
+    post_ids = {post_id_getter('user'), post_id_getter('user_b')}
+    resp = client.get('/api/posts?ids={}&fields=post_id,content'.format(
+        ','.join(str(p) for p in post_ids)))
+    assert resp.status_code == 200
+    assert {int(p['post_id']) for p in resp.json['data']} == post_ids
+    assert {'post_id', 'content'} == set(resp.json['data'][0].keys())
+
+
+def test_client_gets_lean_posts_in_single_query(client, sql_statements):
+    resp_1 = client.get('/api/posts?with_total=false')
+    del sql_statements[:]
+    resp_2 = client.get('/api/posts?with_total=false&expand=')
+    assert resp_2.status_code == 200
+    assert len(sql_statements) == 1
+    assert not 'JOIN' in sql_statements[0]
+    for post, full_post in zip(resp_2.json['data'], resp_1.json['data']):
+        full_post = dict(full_post)
+        user = full_post.pop('user')
+        topic = full_post.pop('topic')
+        assert post == dict(full_post,
+            user_id=user['user_id'], topic_id=topic['topic_id'])
+
+
+def test_client_expands_posts_nested_objects(client):
+    resp_1 = client.get('/api/posts')
+    resp_2 = client.get('/api/posts?expand=user,topic.subforum')
+    for post, full_post in zip(resp_2.json['data'], resp_1.json['data']):
+        assert post['user']['avatar_id'] \
+            == full_post['user']['avatar']['avatar_id']
+        assert not 'avatar' in post['user']
+        assert post['topic']['subforum'] == full_post['topic']['subforum']
+        assert post['topic']['user_id'] == full_post['topic']['user']['user_id']
+        assert not 'last_post' in post['topic']
+
+
+def test_client_expands_and_filters_posts_fields(client):
+    resp = client.get('/api/posts?expand=user&fields=post_id,user')
+    assert {'post_id', 'user'} == set(resp.json['data'][0].keys())
+    assert 'avatar_id' in resp.json['data'][0]['user']
+
+
+def test_client_cannot_expand_unknown_objects(client):
+    resp = client.get('/api/posts?expand=user.posts')
+    assert resp.status_code == 400
@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', [
+    '/api/subforums',
+    '/api/users',
+    '/api/topics',
+    '/api/posts',
+    #fields are dumped by schemas, with loading profiles
+    '/api/subforums?fields=subforum_id,n_topics',
+    '/api/users?fields=user_id,avatar',
+    '/api/topics?fields=topic_id,user,subforum,last_post',
+    '/api/posts?fields=post_id,user,topic',
+])
+def test_client_gets_collection_in_constant_number_of_queries(
+        client, sql_statements, url):
+    sep = '&' if '?' in url else '?'
+    resp_1 = client.get('{}{}max_n_results=1'.format(url, sep))
+    n_queries = len(sql_statements)
+    resp_2 = client.get(url)
+    assert len(resp_2.json['data']) > len(resp_1.json['data'])
+    assert len(sql_statements) == 2*n_queries
+
+
+@pytest.mark.parametrize('url, id_getter', [
+    ('/api/users', 'user_id_getter'),
+    ('/api/topics', 'topic_id_getter'),
+    ('/api/posts', 'post_id_getter'),
+])
+def test_client_multi_gets_collection_in_constant_number_of_queries(
+        request, client, sql_statements, url, id_getter):
+    id_getter = request.getfixturevalue(id_getter)
+    ids = [id_getter('user'), id_getter('user_b')]
+    del sql_statements[:]
+    resp_1 = client.get('{}?ids={}'.format(url, ids[0]))
+    n_queries = len(sql_statements)
+    del sql_statements[:]
+    resp_2 = client.get('{}?ids={},{}'.format(url, *ids))
+    assert len(resp_1.json['data']) == 1
+    assert len(resp_2.json['data']) == 2
+    assert len(sql_statements) == n_queries
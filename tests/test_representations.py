@@ -0,0 +1,42 @@
+import os
+import json
+import pytest
+from nv.representations import (
+    ENCODERS,
+    get_available_encoders,
+    get_dumps,
+)
+
+
+@pytest.mark.parametrize('name', get_available_encoders())
+def test_encoders_agree_on_topics(client, name):
+    data = client.get('/api/topics').json
+    assert json.loads(get_dumps(name)(data).decode('utf-8')) == data
+    assert not b', ' in get_dumps(name, compact=True)({'a': [1, 2]})
+
+
+@pytest.mark.skipif(
+    os.environ.get('NEWVALLEY_TEST_OPTIONAL_DEPS') != 'true',
+    reason='optional dependencies are not required')
+def test_all_encoders_are_available():
+    #so that every encoder is tested by test_encoders_agree_on_topics
+    assert get_available_encoders() == list(ENCODERS)
+
+
+def test_unavailable_encoder_falls_back(app):
+    assert get_dumps('nonexistent')({'a': 'é'}).decode('utf-8') \
+        == '{"a":"é"}'
+
+
+def test_production_responses_are_compact(app, client):
+    app.debug = False
+    resp = client.get('/api/topics')
+    assert resp.json['data']
+    assert not b'\n' in resp.data
+
+
+def test_errors_are_json(client):
+    resp = client.get('/api/topics/0')
+    assert resp.status_code == 404
+    assert resp.mimetype == 'application/json'
+    assert resp.json['errors']
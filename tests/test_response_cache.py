@@ -0,0 +1,214 @@
+import pytest
+from nv.cache import mk_cache
+
+
+@pytest.fixture(params=['lru', 'filesystem'])
+def cached_app(request, app, tmpdir):
+    if request.param == 'filesystem':
+        #shared backend, as used with many workers
+        spec = 'filesystem:{}'.format(tmpdir)
+        app.extensions['response_cache'] = mk_cache(spec)
+    yield app
+
+
+def test_cached_response_does_not_query_database(
+        cached_app, client, sql_statements):
+    resp_1 = client.get('/api/topics?order=newest')
+    del sql_statements[:]
+    resp_2 = client.get('/api/topics?order=newest')
+    assert resp_2.status_code == 200
+    assert resp_2.json == resp_1.json
+    assert not sql_statements
+
+
+def test_query_args_are_part_of_cache_key(cached_app, client):
+    resp_1 = client.get('/api/topics?order=newest&max_n_results=1')
+    resp_2 = client.get('/api/topics?max_n_results=2&order=newest')
+    assert len(resp_1.json['data']) == 1
+    assert len(resp_2.json['data']) == 2
+
+
+def test_new_post_invalidates_cached_topics_and_posts(
+        cached_app, client, client_with_tok, topic_id):
+    url = '/api/topics/{}/posts'.format(topic_id)
+    resp_1 = client.get(url)
+    resp_2 = client.get('/api/topics')
+    resp_3 = client_with_tok.post(url, data={'content': 'new post'})
+    resp_4 = client.get(url)
+    resp_5 = client.get('/api/topics')
+    post_id = resp_3.json['data']['post_id']
+    assert post_id not in {p['post_id'] for p in resp_1.json['data']}
+    assert post_id in {p['post_id'] for p in resp_4.json['data']}
+    topics = {t['topic_id']: t for t in resp_5.json['data']}
+    assert topics[str(topic_id)]['last_post']['post_id'] == post_id
+
+
+def test_user_edit_invalidates_cached_topics(
+        cached_app, client, client_with_tok, user_id):
+    resp_1 = client.get('/api/topics')
+    resp_2 = client_with_tok.put('/api/users/{}'.format(user_id),
+        data={'signature': 'new signature'})
+    resp_3 = client.get('/api/topics')
+    assert resp_2.status_code == 200
+    assert 'new signature' in {t['user']['signature']
+        for t in resp_3.json['data']}
+
+
+def _get_users_n_posts(resp):
+    return {p['user']['username']: p['user']['n_posts']
+        for p in resp.json['data']}
+
+
+def test_new_post_invalidates_cached_pages_of_author(
+        cached_app, client, client_with_tok, topic_id_getter):
+    topic_id_a = topic_id_getter('user')
+    topic_id_b = topic_id_getter('user_b')
+    url = '/api/topics/{}/posts'.format(topic_id_a)
+    resp_1 = client.get(url)
+    resp_2 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id_b),
+        data={'content': 'new post'})
+    resp_3 = client.get(url)
+    assert resp_2.status_code == 200
+    assert _get_users_n_posts(resp_3)['user'] \
+        == _get_users_n_posts(resp_1)['user'] + 1
+    assert _get_users_n_posts(resp_3)['user_b'] \
+        == _get_users_n_posts(resp_1)['user_b']
+
+
+def test_deletions_invalidate_cached_pages_of_authors(
+        cached_app, client, client_with_tok, mod_with_tok, topic_id_getter):
+    topic_id_a = topic_id_getter('user')
+    topic_id_b = topic_id_getter('user_b')
+    url = '/api/topics/{}/posts'.format(topic_id_a)
+    resp_1 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id_b),
+        data={'content': 'new post'})
+    client_with_tok.post('/api/topics/{}/posts'.format(topic_id_b),
+        data={'content': 'another new post'})
+    resp_2 = client.get(url)
+    resp_3 = client_with_tok.delete(
+        '/api/posts/{}'.format(resp_1.json['data']['post_id']))
+    resp_4 = client.get(url)
+    resp_5 = mod_with_tok.delete('/api/topics/{}'.format(topic_id_b))
+    resp_6 = client.get(url)
+    assert resp_3.status_code == 204
+    assert resp_5.status_code == 204
+    assert _get_users_n_posts(resp_4)['user'] \
+        == _get_users_n_posts(resp_2)['user'] - 1
+    assert _get_users_n_posts(resp_6)['user'] \
+        == _get_users_n_posts(resp_4)['user'] - 1
+
+
+def _get_subforums_n_topics(client, topic_id):
+    resp_1 = client.get('/api/topics/{}/posts'.format(topic_id))
+    resp_2 = client.get('/api/topics/{}/page'.format(topic_id))
+    return [p['topic']['subforum']['n_topics'] for p in resp_1.json['data']] \
+        + [resp_2.json['topic']['subforum']['n_topics']]
+
+
+def test_new_topic_invalidates_cached_pages_nesting_its_subforum(
+        cached_app, client, admin_with_tok, topic_id_getter, subforum_id):
+    topic_id = topic_id_getter('user')
+    n_topics_1 = _get_subforums_n_topics(client, topic_id)
+    resp = admin_with_tok.post('/api/subforums/{}/topics'.format(subforum_id),
+        data={'title': 'new topic'})
+    n_topics_2 = _get_subforums_n_topics(client, topic_id)
+    resp_2 = admin_with_tok.delete(
+        '/api/topics/{}'.format(resp.json['data']['topic_id']))
+    n_topics_3 = _get_subforums_n_topics(client, topic_id)
+    assert resp.status_code == 200
+    assert resp_2.status_code == 204
+    assert n_topics_2 == [n + 1 for n in n_topics_1]
+    assert n_topics_3 == n_topics_1
+
+
+def _get_page_subforum(client, topic_id):
+    return client.get(
+        '/api/topics/{}/page'.format(topic_id)).json['topic']['subforum']
+
+
+def test_moved_topic_invalidates_cached_pages_nesting_its_subforums(
+        cached_app, client, admin_with_tok, mod_with_tok, topic_id_getter,
+        subforum_id):
+    topic_id = topic_id_getter('user')
+    moved_topic_id = topic_id_getter('user_b')
+    old_subforum_id = _get_page_subforum(client, moved_topic_id)['subforum_id']
+    #untouched topic of old subforum
+    old_topic_id = admin_with_tok.post(
+        '/api/subforums/{}/topics'.format(old_subforum_id),
+        data={'title': 'new topic'}).json['data']['topic_id']
+    n_topics_1 = _get_subforums_n_topics(client, topic_id)
+    old_n_topics_1 = _get_subforums_n_topics(client, old_topic_id)
+    resp = mod_with_tok.put('/api/topics/{}'.format(moved_topic_id),
+        data={'subforum_id': subforum_id})
+    n_topics_2 = _get_subforums_n_topics(client, topic_id)
+    old_n_topics_2 = _get_subforums_n_topics(client, old_topic_id)
+    assert resp.status_code == 200
+    assert n_topics_2 == [n + 1 for n in n_topics_1]
+    assert old_n_topics_2 == [n - 1 for n in old_n_topics_1]
+    assert _get_page_subforum(client, moved_topic_id)['n_topics'] \
+        == n_topics_2[-1]
+
+
+def test_moderation_move_invalidates_cached_pages_nesting_subforums(
+        cached_app, client, admin_with_tok, mod_with_tok, topic_id_getter,
+        subforum_id):
+    topic_id = topic_id_getter('user')
+    moved_topic_id = topic_id_getter('user_b')
+    old_subforum_id = _get_page_subforum(client, moved_topic_id)['subforum_id']
+    old_topic_id = admin_with_tok.post(
+        '/api/subforums/{}/topics'.format(old_subforum_id),
+        data={'title': 'new topic'}).json['data']['topic_id']
+    n_topics_1 = _get_subforums_n_topics(client, topic_id)
+    old_n_topics_1 = _get_subforums_n_topics(client, old_topic_id)
+    resp = mod_with_tok.put('/api/moderation/topics',
+        data={'topic_ids': moved_topic_id, 'subforum_id': subforum_id})
+    assert resp.status_code == 200
+    assert _get_subforums_n_topics(client, topic_id) \
+        == [n + 1 for n in n_topics_1]
+    assert _get_subforums_n_topics(client, old_topic_id) \
+        == [n - 1 for n in old_n_topics_1]
+
+
+def test_user_edit_keeps_unrelated_cached_pages(
+        cached_app, client, client_with_tok, user_id, sql_statements):
+    client.get('/api/subforums')
+    client_with_tok.put('/api/users/{}'.format(user_id),
+        data={'signature': 'new signature'})
+    del sql_statements[:]
+    resp = client.get('/api/subforums')
+    assert resp.status_code == 200
+    assert not sql_statements
+
+
+def test_avatar_edit_invalidates_cached_pages_of_its_users(
+        cached_app, client, admin_with_tok, topic_id):
+    url = '/api/topics/{}/posts'.format(topic_id)
+    resp_1 = client.get(url)
+    avatar_id = resp_1.json['data'][0]['user']['avatar']['avatar_id']
+    resp_2 = admin_with_tok.put('/api/avatars/{}'.format(avatar_id),
+        data={'uri': 'http://example.com/new.png'})
+    resp_3 = client.get(url)
+    assert resp_2.status_code == 200
+    assert {p['user']['avatar']['uri'] for p in resp_3.json['data']} \
+        == {'http://example.com/new.png'}
+
+
+def test_user_deletion_invalidates_cached_pages_of_its_posts(
+        cached_app, client, admin_with_tok, topic_id_getter, user_id_getter):
+    url = '/api/topics/{}/posts'.format(topic_id_getter('user'))
+    resp_1 = client.get(url)
+    resp_2 = admin_with_tok.delete(
+        '/api/users/{}'.format(user_id_getter('user_b')))
+    resp_3 = client.get(url)
+    assert resp_2.status_code == 204
+    assert 'user_b' in {p['user']['username'] for p in resp_1.json['data']}
+    assert not 'user_b' in {p['user']['username'] for p in resp_3.json['data']}
+
+
+def test_authenticated_requests_are_not_cached(
+        cached_app, client_with_tok, sql_statements):
+    resp_1 = client_with_tok.get('/api/subforums')
+    del sql_statements[:]
+    resp_2 = client_with_tok.get('/api/subforums')
+    assert resp_2.status_code == 200
+    assert sql_statements
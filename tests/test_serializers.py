@@ -0,0 +1,16 @@
+import pytest
+
+
+@pytest.mark.parametrize('url', [
+    '/api/subforums',
+    '/api/users',
+    '/api/topics',
+    '/api/posts?order=oldest',
+])
+def test_compiled_dump_equals_schema_dump(client, url):
+    #the schema is used if fields are given
+    resp = client.get(url)
+    fields = ','.join(resp.json['data'][0].keys())
+    schema_resp = client.get('{}{}fields={}'.format(
+        url, '&' if '?' in url else '?', fields))
+    assert resp.json['data'] == schema_resp.json['data']
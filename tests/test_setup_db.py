@@ -0,0 +1,134 @@
+import pytest
+import datetime as dt
+import sqlalchemy
+from nv.app import get_app
+from nv import metaconfig
+from nv.database import db
+from nv.models import User, Avatar, Subforum, Topic, Post, RevokedToken
+from nv.setup_db import migrate_db
+
+
+@pytest.fixture()
+def file_app(tmpdir):
+    '''
+    App with tables created in a file database, which persists across
+    connections as migrations need.
+    '''
+    conf = metaconfig.get_app_test_config_class()
+    conf.SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(tmpdir.join('db'))
+    app = get_app(conf)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_migrate_db_moves_legacy_roles_to_mask(file_app):
+    with file_app.app_context():
+        #legacy column of roles
+        db.engine.execute(
+            "ALTER TABLE users ADD COLUMN roles VARCHAR(256) NOT NULL "
+            "DEFAULT 'user'")
+        for user_id, username, roles in [
+                (1, 'admin', 'admin, user'), (2, 'user', 'user')]:
+            User.create_and_save(user_id=user_id, username=username,
+                password='x', email='{}@nv.com'.format(username))
+            db.engine.execute(
+                'UPDATE users SET roles = ?, roles_mask = 0 '
+                'WHERE user_id = ?', roles, user_id)
+    migrate_db(file_app)
+    with file_app.app_context():
+        inspector = sqlalchemy.inspect(db.engine)
+        cols = {c['name'] for c in inspector.get_columns('users')}
+        idxs = {i['name'] for i in inspector.get_indexes('users')}
+        assert not 'roles' in cols
+        assert 'ix_users_roles_mask' in idxs
+        assert set(User.query.get(1).roles) == {'admin', 'user'}
+        assert User.query.get(2).roles == ['user']
+        #new users can be created without the legacy column
+        User.create_and_save(username='new', password='x', email='new@nv.com')
+
+
+def test_migrate_db_adds_fractions_of_seconds_to_sqlite_datetimes(file_app):
+    with file_app.app_context():
+        #table as created before fractions of seconds were kept
+        ddl = db.engine.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'avatars'").scalar()
+        legacy_ddl = ddl.replace(
+            "(strftime('%Y-%m-%d %H:%M:%f', 'now') || '000')",
+            'CURRENT_TIMESTAMP')
+        assert legacy_ddl != ddl
+        db.engine.execute('DROP TABLE avatars')
+        db.engine.execute(legacy_ddl)
+        avatar_id = Avatar.create_and_save(
+            uri='http://example.com/img.jpg', category='dummy').avatar_id
+        #as stored before fractions of seconds were kept
+        db.engine.execute(
+            "UPDATE avatars SET created_at = '2018-11-20 10:30:01'")
+    migrate_db(file_app)
+    with file_app.app_context():
+        assert db.engine.execute(
+            'SELECT created_at FROM avatars').scalar() \
+            == '2018-11-20 10:30:01.000000'
+        assert Avatar.query.filter(
+            Avatar.created_at >= dt.datetime(2018, 11, 20, 10, 30, 1)).count() \
+            == 1
+        #rows inserted after the migration, within the same second
+        avatars_ids = {avatar_id}
+        for i in range(3):
+            avatars_ids.add(Avatar.create_and_save(
+                uri='http://example.com/img.jpg', category='dummy').avatar_id)
+    client = file_app.test_client()
+    url = '/api/avatars?order=newest&max_n_results=1'
+    resp = client.get(url)
+    paged_ids = [resp.json['data'][0]['avatar_id']]
+    while resp.json['next_cursor'] is not None:
+        resp = client.get('{}&cursor={}'.format(url, resp.json['next_cursor']))
+        paged_ids.extend(a['avatar_id'] for a in resp.json['data'])
+        assert len(paged_ids) <= len(avatars_ids)
+    assert set(map(int, paged_ids)) == avatars_ids
+
+
+def test_migrate_db_sets_expiration_of_legacy_revoked_tokens(file_app):
+    with file_app.app_context():
+        #as stored before expiration times were kept
+        RevokedToken.create_and_save(jti='legacy')
+    migrate_db(file_app)
+    with file_app.app_context():
+        lifetime = max(file_app.config['JWT_ACCESS_TOKEN_EXPIRES'],
+            file_app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+        expires_at = RevokedToken.query.filter_by(jti='legacy').one().expires_at
+        assert dt.datetime.utcnow() < expires_at \
+            <= dt.datetime.utcnow() + lifetime
+        assert RevokedToken.prune_expired(now=expires_at) == 1
+
+
+def test_migrate_db_computes_activity_of_existing_topics(file_app):
+    with file_app.app_context():
+        user_id = User.create_and_save(
+            username='user', password='x', email='user@nv.com').user_id
+        subforum_id = Subforum.create_and_save(
+            title='subforum', description='descr', position=1).subforum_id
+        topic_id = Topic.create_and_save(title='topic', user_id=user_id,
+            subforum_id=subforum_id).topic_id
+        post_ids = [Post.create_and_save(content=content, user_id=user_id,
+            topic_id=topic_id).post_id for content in ['first', 'last']]
+        #tables as created before activity was denormalized
+        for index in [
+                'ix_topics_last_post_at', 'ix_topics_subforum_id_last_post_at']:
+            db.engine.execute('DROP INDEX {}'.format(index))
+        for table, column in [
+                ('topics', 'n_posts'),
+                ('topics', 'last_post_id'),
+                ('topics', 'last_post_at'),
+                ('users', 'last_posted_at'),
+                ('users', 'last_topic_created_at')]:
+            db.engine.execute(
+                'ALTER TABLE {} DROP COLUMN {}'.format(table, column))
+    migrate_db(file_app)
+    resp = file_app.test_client().get('/api/topics/{}'.format(topic_id))
+    assert resp.json['data']['n_posts'] == 2
+    assert int(resp.json['data']['last_post']['post_id']) == post_ids[-1]
+    with file_app.app_context():
+        user = User.query.get(user_id)
+        assert user.last_posted_at is not None
+        assert user.last_topic_created_at is not None
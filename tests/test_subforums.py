@@ -351,3 +351,32 @@ def test_logged_in_client_under_antiflood_cannot_post_in_interval(
     assert end_time - start_time < antiflood_time
     assert resp_1.status_code == 200
     assert resp_2.status_code == 429
+
+
+def test_deleting_subforum_deletes_its_topics_and_fixes_counters(
+        admin_with_tok, client_with_tok, mod_with_tok, subforum_id,
+        user_id_getter, sql_statements):
+    user_id = user_id_getter('user')
+    mod_id = user_id_getter('mod')
+    resp_1 = admin_with_tok.get('/api/users/{}'.format(user_id))
+    resp_2 = admin_with_tok.get('/api/users/{}'.format(mod_id))
+    resp_3 = client_with_tok.post(
+        '/api/subforums/{}/topics'.format(subforum_id),
+        data={'title': 'to be deleted'})
+    topic_id = resp_3.json['data']['topic_id']
+    post_ids = [mod_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'post {}'.format(i)}).json['data']['post_id']
+        for i in range(4)]
+    del sql_statements[:]
+    resp_4 = admin_with_tok.delete('/api/subforums/{}'.format(subforum_id))
+    #set-based: one statement per table whatever the number of rows
+    assert len([s for s in sql_statements if s.startswith('DELETE')]) == 3
+    resp_5 = admin_with_tok.get('/api/users/{}'.format(user_id))
+    resp_6 = admin_with_tok.get('/api/users/{}'.format(mod_id))
+    assert resp_4.status_code == 204
+    assert admin_with_tok.get(
+        '/api/topics/{}'.format(topic_id)).status_code == 404
+    assert all(admin_with_tok.get('/api/posts/{}'.format(p)).status_code
+        == 404 for p in post_ids)
+    assert resp_5.json['data']['n_topics'] == resp_1.json['data']['n_topics']
+    assert resp_6.json['data']['n_posts'] == resp_2.json['data']['n_posts']
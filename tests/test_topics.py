@@ -1,4 +1,13 @@
 import time
+from flask_jwt_extended import create_access_token
+from nv.app import get_app
+from nv import metaconfig
+from nv.database import db
+from nv.models import (
+    User,
+    Subforum,
+    Topic,
+)
 
 
 def test_client_can_get_topics(client):
@@ -36,6 +45,18 @@ def test_client_filters_topics_fields(client):
     } == set(topics[0].keys())
 
 
+def test_client_gets_filtered_topics_fields_in_single_query(
+        client, sql_statements):
+    resp = client.get('/api/topics?fields=topic_id,title&with_total=false')
+    assert resp.status_code == 200
+    assert {
+        'topic_id',
+        'title',
+    } == set(resp.json['data'][0].keys())
+    assert len(sql_statements) == 1
+    assert not 'status' in sql_statements[0]
+
+
 def test_client_offsets_topics(client):
     resp_1 = client.get('/api/topics')
     resp_2 = client.get('/api/topics?offset=2')
@@ -43,6 +64,21 @@ def test_client_offsets_topics(client):
         == len(resp_2.json['data']) + min(2, len(resp_1.json['data']))
 
 
+def test_client_pages_topics_with_cursor(client):
+    resp = client.get('/api/topics')
+    topic_ids = []
+    cursor = ''
+    for __ in range(len(resp.json['data'])):
+        resp_2 = client.get('/api/topics?max_n_results=1{}'.format(cursor))
+        assert resp_2.status_code == 200
+        assert resp_2.json['total'] == resp.json['total']
+        topic_ids.extend(t['topic_id'] for t in resp_2.json['data'])
+        if resp_2.json['next_cursor'] is None:
+            break
+        cursor = '&cursor={}'.format(resp_2.json['next_cursor'])
+    assert topic_ids == [t['topic_id'] for t in resp.json['data']]
+
+
 def test_client_limits_topics(client):
     resp_1 = client.get('/api/topics?max_n_results=1')
     resp_2 = client.get('/api/topics?max_n_results=2')
@@ -390,3 +426,236 @@ def test_client_corretly_gets_topics_by_newest_last_post(
     assert resp_2.json['data'][0]['topic_id'] == str(topic_id_1)
     assert resp_4.json['data'][0]['topic_id'] == str(topic_id_2)
     assert resp_4.json['data'][1]['topic_id'] == str(topic_id_1)
+
+
+def test_client_gets_same_aggregates_in_topics_and_topic(client):
+    resp = client.get('/api/topics')
+    for topic in resp.json['data']:
+        resp_2 = client.get('/api/topics/{}'.format(topic['topic_id']))
+        assert topic['n_posts'] == resp_2.json['data']['n_posts']
+        assert topic['last_post'] == resp_2.json['data']['last_post']
+
+
+def test_logged_in_client_correctly_gets_last_post_after_deletion(
+        client_with_tok, topic_id):
+    resp_1 = client_with_tok.get('/api/topics/{}'.format(topic_id))
+    #test is sensitive to precision of datetime
+    time.sleep(1)
+    resp_2 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={
+            'content': 'olar',
+        }
+    )
+    resp_3 = client_with_tok.delete(
+        '/api/posts/{}'.format(resp_2.json['data']['post_id']))
+    resp_4 = client_with_tok.get('/api/topics/{}'.format(topic_id))
+    assert resp_3.status_code == 204
+    assert resp_4.json['data']['n_posts'] == resp_1.json['data']['n_posts']
+    assert resp_4.json['data']['last_post']['post_id'] \
+        == resp_1.json['data']['last_post']['post_id']
+
+
+def test_antiflood_check_does_not_scan_posts(
+        client_with_tok_under_antifloood, antiflood_time, topic_id,
+        sql_statements):
+    time.sleep(antiflood_time)
+    resp_1 = client_with_tok_under_antifloood.post(
+        '/api/topics/{}/posts'.format(topic_id), data={'content': 'olar'})
+    del sql_statements[:]
+    resp_2 = client_with_tok_under_antifloood.post(
+        '/api/topics/{}/posts'.format(topic_id), data={'content': 'olar2'})
+    assert resp_1.status_code == 200
+    assert resp_2.status_code == 429
+    assert not [s for s in sql_statements
+        if 'FROM posts' in s and 'ORDER BY' in s]
+
+
+def test_antiflood_check_is_separate_for_topics_and_posts(
+        client_with_tok_under_antifloood, antiflood_time, subforum_id):
+    time.sleep(antiflood_time)
+    resp_1 = client_with_tok_under_antifloood.post(
+        '/api/subforums/{}/topics'.format(subforum_id),
+        data={'title': 'new topic'})
+    resp_2 = client_with_tok_under_antifloood.post(
+        '/api/topics/{}/posts'.format(resp_1.json['data']['topic_id']),
+        data={'content': 'first post of new topic'})
+    assert resp_1.status_code == 200
+    assert resp_2.status_code == 200
+
+
+def test_antiflood_check_is_consistent_across_workers(tmpdir, antiflood_time):
+    #two workers with their own (not distributed) shared caches and one db
+    conf = metaconfig.get_app_test_config_class()
+    conf.SQLALCHEMY_DATABASE_URI = 'sqlite:///{}'.format(tmpdir.join('db'))
+    conf.MIN_POST_TIME_INTERVAL = antiflood_time
+    apps = [get_app(conf), get_app(conf)]
+    with apps[0].app_context():
+        db.create_all()
+        user = User.create_and_save(
+            username='user', password='x', email='user@users.com')
+        subforum = Subforum.create_and_save(
+            title='subforum', description='descr', position=0)
+        topic_id = Topic.create_and_save(
+            title='topic', subforum_id=subforum.subforum_id,
+            user_id=user.user_id).topic_id
+        token = create_access_token(identity=user)
+    clients = [app.test_client() for app in apps]
+    def post(client):
+        return client.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'olar'},
+            headers={'Authorization': 'Bearer {}'.format(token)})
+    resp_1 = post(clients[1])
+    time.sleep(antiflood_time)
+    resp_2 = post(clients[0])
+    resp_3 = post(clients[1])
+    assert resp_1.status_code == 200
+    assert resp_2.status_code == 200
+    assert resp_3.status_code == 429
+
+
+def test_client_streams_topics(client, monkeypatch):
+    #objects are dumped one by one
+    monkeypatch.setattr('nv.resources.common.STREAM_BATCH_SIZE', 1)
+    for args in ['', '&max_n_results=1', '&max_n_results=2&offset=1',
+            '&fields=topic_id,title,last_post', '&statuses=pinned']:
+        resp_1 = client.get('/api/topics?order=newest{}'.format(args))
+        resp_2 = client.get('/api/topics?order=newest&stream=true{}'.format(
+            args))
+        assert resp_2.status_code == 200
+        assert resp_2.is_streamed
+        assert resp_2.json == resp_1.json
+
+
+def test_client_pages_streamed_topics_with_cursor(client):
+    resp = client.get('/api/topics')
+    resp_1 = client.get('/api/topics?max_n_results=1&stream=true')
+    resp_2 = client.get('/api/topics?max_n_results=1&stream=true&cursor={}'
+        .format(resp_1.json['next_cursor']))
+    assert resp_1.json['offset'] == 1
+    assert resp_2.json['offset'] is None
+    assert [t['topic_id'] for t in resp_1.json['data'] + resp_2.json['data']] \
+        == [t['topic_id'] for t in resp.json['data'][:2]]
+
+
+def test_deleting_topic_decrements_n_posts_of_its_posts_authors(
+        client_with_tok, mod_with_tok, subforum_id, user_id_getter):
+    user_id = user_id_getter('user')
+    mod_id = user_id_getter('mod')
+    resp_1 = client_with_tok.get('/api/users/{}'.format(user_id))
+    resp_2 = client_with_tok.get('/api/users/{}'.format(mod_id))
+    resp_3 = client_with_tok.post(
+        '/api/subforums/{}/topics'.format(subforum_id),
+        data={'title': 'to be deleted'})
+    topic_id = resp_3.json['data']['topic_id']
+    for __ in range(2):
+        mod_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'post'})
+    resp_4 = client_with_tok.delete('/api/topics/{}'.format(topic_id))
+    resp_5 = client_with_tok.get('/api/users/{}'.format(user_id))
+    resp_6 = client_with_tok.get('/api/users/{}'.format(mod_id))
+    assert resp_4.status_code == 204
+    assert resp_5.json['data']['n_topics'] == resp_1.json['data']['n_topics']
+    assert resp_6.json['data']['n_posts'] == resp_2.json['data']['n_posts']
+
+
+def test_client_multi_gets_topics(client, topic_id_getter):
+    topic_ids = {topic_id_getter('user'), topic_id_getter('user_b')}
+    resp = client.get('/api/topics?ids={}'.format(
+        ','.join(str(t) for t in topic_ids)))
+    assert resp.status_code == 200
+    assert {int(t['topic_id']) for t in resp.json['data']} == topic_ids
+
+
+def test_client_gets_topic_page(client, topic_id):
+    resp_1 = client.get('/api/topics/{}'.format(topic_id))
+    resp_2 = client.get('/api/topics/{}/posts'.format(topic_id))
+    resp_3 = client.get('/api/topics/{}/page'.format(topic_id))
+    assert resp_3.status_code == 200
+    page = resp_3.json
+    topic = dict(resp_1.json['data'])
+    user = topic.pop('user')
+    last_post = dict(topic.pop('last_post'))
+    last_post_user = last_post.pop('user')
+    assert page['topic'] == dict(topic, user_id=user['user_id'],
+        last_post=dict(last_post, user_id=last_post_user['user_id']))
+    assert page['total'] == resp_2.json['total']
+    users = page['included']['users']
+    avatars = page['included']['avatars']
+    for post, full_post in zip(page['data'], resp_2.json['data']):
+        full_post = dict(full_post)
+        del full_post['topic']
+        full_user = dict(full_post.pop('user'))
+        assert post == dict(full_post, user_id=full_user['user_id'])
+        avatar = full_user.pop('avatar')
+        assert users[post['user_id']] == dict(
+            full_user, avatar_id=avatar['avatar_id'])
+        assert avatars[avatar['avatar_id']] == avatar
+    assert user['user_id'] in users
+    assert last_post_user['user_id'] in users
+
+
+def test_topic_page_validators_are_checked_before_serialization(
+        app, client, topic_id, monkeypatch):
+    #not served from the response cache
+    app.extensions['response_cache'] = None
+    url = '/api/topics/{}/page'.format(topic_id)
+    resp_1 = client.get(url)
+    def fail(*args, **kwargs):
+        assert False
+    monkeypatch.setattr(
+        'nv.resources.topics.TopicPageRes.topic_serializer.dump', fail)
+    monkeypatch.setattr('nv.resources.common.dump_included_users', fail)
+    resp_2 = client.get(url, headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 304
+
+
+def test_topic_page_is_invalidated_by_user_edit(
+        client, client_with_tok, topic_id, user_id):
+    url = '/api/topics/{}/page'.format(topic_id)
+    resp_1 = client.get(url)
+    client_with_tok.put('/api/users/{}'.format(user_id),
+        data={'signature': 'new signature'})
+    resp_2 = client.get(url, headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 200
+    assert resp_2.json['included']['users'][str(user_id)]['signature'] \
+        == 'new signature'
+
+
+def test_topic_page_is_smaller_than_topic_and_posts(
+        client, client_with_tok, topic_id):
+    for i in range(20):
+        client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+            data={'content': 'post {}'.format(i)})
+    resp_1 = client.get('/api/topics/{}'.format(topic_id))
+    resp_2 = client.get('/api/topics/{}/posts'.format(topic_id))
+    resp_3 = client.get('/api/topics/{}/page'.format(topic_id))
+    assert len(resp_3.json['data']) == len(resp_2.json['data'])
+    assert 4*len(resp_3.data) < len(resp_1.data) + len(resp_2.data)
+
+
+def test_topic_page_is_invalidated_by_new_post(
+        client, client_with_tok, topic_id):
+    url = '/api/topics/{}/page'.format(topic_id)
+    resp_1 = client.get(url)
+    client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'new post'})
+    resp_2 = client.get(url, headers={'If-None-Match': resp_1.headers['ETag']})
+    assert resp_2.status_code == 200
+    assert resp_2.json['total'] == resp_1.json['total'] + 1
+    resp_3 = client.get(url, headers={'If-None-Match': resp_2.headers['ETag']})
+    assert resp_3.status_code == 304
+
+
+def test_missing_topic_page_is_not_found(client):
+    assert client.get('/api/topics/1/page').status_code == 404
+
+
+def test_client_expands_topics_nested_objects(client):
+    resp_1 = client.get('/api/topics')
+    resp_2 = client.get('/api/topics?expand=last_post')
+    for topic, full_topic in zip(resp_2.json['data'], resp_1.json['data']):
+        assert topic['user_id'] == full_topic['user']['user_id']
+        assert topic['subforum_id'] == full_topic['subforum']['subforum_id']
+        if full_topic['last_post']:
+            assert topic['last_post']['user_id'] \
+                == full_topic['last_post']['user']['user_id']
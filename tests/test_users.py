@@ -366,3 +366,105 @@ def test_client_gets_correct_user_topics_fields(client, user_id):
         'created_at',
         'updated_at',
     } == set(resp.json['data'][0].keys())
+
+
+def test_permission_checks_do_not_query_users(
+        client_with_tok, avatar_id, sql_statements):
+    resp_1 = client_with_tok.delete('/api/avatars/{}'.format(avatar_id))
+    del sql_statements[:]
+    resp_2 = client_with_tok.delete('/api/avatars/{}'.format(avatar_id))
+    assert resp_2.status_code == 401
+    assert not [s for s in sql_statements if 'FROM users' in s]
+
+
+def test_banned_user_cannot_post_right_after_ban(
+        client_with_tok_getter, admin_with_tok, user_id_getter, topic_id):
+    client_with_tok = client_with_tok_getter('user_b')
+    resp_1 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'before ban'})
+    resp_2 = admin_with_tok.put(
+        '/api/users/{}'.format(user_id_getter('user_b')),
+        data={'status': 'banned'})
+    resp_3 = client_with_tok.post('/api/topics/{}/posts'.format(topic_id),
+        data={'content': 'after ban'})
+    assert resp_1.status_code == 200
+    assert resp_2.status_code == 200
+    assert resp_3.status_code == 401
+
+
+def test_client_filters_users_by_roles(client):
+    resp = client.get('/api/users?roles=moderator,admin')
+    assert resp.status_code == 200
+    assert {'admin', 'mod'} == {u['username'] for u in resp.json['data']}
+    assert all({'moderator', 'admin'} & set(u['roles'])
+        for u in resp.json['data'])
+
+
+def test_client_filters_users_by_statuses(client, admin_with_tok,
+        user_id_getter):
+    resp_1 = admin_with_tok.put(
+        '/api/users/{}'.format(user_id_getter('user_b')),
+        data={'status': 'banned'})
+    resp_2 = client.get('/api/users?statuses=banned')
+    resp_3 = client.get('/api/users?statuses=active&roles=user')
+    assert resp_1.status_code == 200
+    assert ['user_b'] == [u['username'] for u in resp_2.json['data']]
+    assert ['user'] == [u['username'] for u in resp_3.json['data']]
+
+
+def test_client_cannot_filter_users_by_invalid_role(client):
+    resp = client.get('/api/users?roles=superuser')
+    assert resp.status_code == 422
+
+
+def test_admin_edits_user_roles(admin_with_tok, user_id_getter):
+    user_id = user_id_getter('user_b')
+    resp_1 = admin_with_tok.put('/api/users/{}'.format(user_id),
+        data={'roles': 'moderator, user,moderator'})
+    resp_2 = admin_with_tok.get('/api/users/{}'.format(user_id))
+    assert resp_1.status_code == 200
+    assert resp_2.json['data']['roles'] == ['user', 'moderator']
+
+
+def test_deleting_user_fixes_topics_and_users_activity(
+        admin_with_tok, client_with_tok_getter, subforum_id,
+        user_id_getter, topic_id_getter):
+    user_b = client_with_tok_getter('user_b')
+    mod = client_with_tok_getter('mod')
+    mod_id = user_id_getter('mod')
+    other_topic_id = topic_id_getter('user')
+    resp_1 = admin_with_tok.get('/api/users/{}'.format(mod_id))
+    resp_2 = admin_with_tok.get('/api/topics/{}'.format(other_topic_id))
+    #topic of user_b with posts from mod, and post of user_b elsewhere
+    topic_id = user_b.post('/api/subforums/{}/topics'.format(subforum_id),
+        data={'title': 'to be deleted'}).json['data']['topic_id']
+    mod.post('/api/topics/{}/posts'.format(topic_id), data={'content': 'a'})
+    user_b.post('/api/topics/{}/posts'.format(other_topic_id),
+        data={'content': 'b'})
+    resp_3 = admin_with_tok.delete(
+        '/api/users/{}'.format(user_id_getter('user_b')))
+    resp_4 = admin_with_tok.get('/api/users/{}'.format(mod_id))
+    resp_5 = admin_with_tok.get('/api/topics/{}'.format(other_topic_id))
+    assert resp_3.status_code == 204
+    assert resp_4.json['data']['n_posts'] == resp_1.json['data']['n_posts']
+    #the seeded post of user_b is deleted as well
+    assert resp_5.json['data']['n_posts'] \
+        == resp_2.json['data']['n_posts'] - 1
+    assert resp_5.json['data']['last_post']['content'] == 'post content'
+
+
+def test_client_multi_gets_users(client, user_id_getter):
+    user_ids = {user_id_getter('user'), user_id_getter('mod')}
+    resp = client.get('/api/users?ids={}&fields=user_id,username'.format(
+        ','.join(str(u) for u in user_ids | {1})))
+    assert resp.status_code == 200
+    assert resp.json['total'] == 2
+    assert {int(u['user_id']) for u in resp.json['data']} == user_ids
+    assert {'user_id', 'username'} == set(resp.json['data'][0].keys())
+
+
+def test_client_cannot_multi_get_too_many_users(client):
+    from nv.resources.common import MAX_N_IDS
+    resp = client.get('/api/users?ids={}'.format(
+        ','.join(str(i) for i in range(MAX_N_IDS + 1))))
+    assert resp.status_code == 422